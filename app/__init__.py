@@ -1,15 +1,29 @@
 import os
-from flask import Flask, send_from_directory, jsonify, render_template, redirect
+from flask import Flask, current_app, jsonify, render_template, redirect, request
+from flask_jwt_extended import jwt_required
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 from .config import Config
 from .extensions import db, migrate, jwt, api
 from . import models
+from . import database
 from .blacklist import blacklist
+from .cache import catalog_cache
+from .changes import changes_cli
+from .idempotency import idempotency_cli
+from .images import send_upload
+from .jobs import image_jobs, images_cli
+from .metrics import metrics
+from .passwords import passwords
+from .rollup import rollup_cli
+from .seed import seed_command
 
 from .routes.auth import auth_ns
 from .routes.categories import cat_ns
 from .routes.products import prod_ns
 from .routes.invoices import inv_ns
 from .routes.reports import rep_ns
+from .routes.changes import chg_ns
 
 
 def create_app():
@@ -26,9 +40,19 @@ def create_app():
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
     # Initialize extensions
-    db.init_app(app)
+    database.init_app(app)  # db.init_app with the pool settings
     migrate.init_app(app, db)
     jwt.init_app(app)
+    blacklist.init_app(app)
+    image_jobs.init_app(app)
+    catalog_cache.init_app(app)
+    metrics.init_app(app)
+    passwords.init_app(app)
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(seed_command)
 
     # Swagger Authentication
     authorizations = {
@@ -47,8 +71,12 @@ def create_app():
     # JWT Handlers
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
+        # Access tokens are trusted until they expire, so protected
+        # endpoints cost a signature check and no shared lookup
+        if jwt_payload["type"] != "refresh":
+            return False
         jti = jwt_payload["jti"]
-        return jti in blacklist
+        return blacklist.is_revoked(jti)
 
     @jwt.unauthorized_loader
     def missing_token_callback(error):
@@ -62,17 +90,45 @@ def create_app():
     def expired_token_callback(jwt_header, jwt_payload):
         return jsonify({"msg": "Token has expired"}), 401
 
+    # flask-restx answers exceptions raised in a Resource itself, as 500s,
+    # before Flask's handlers (and so the loaders above) ever see them
+    @api.errorhandler(JWTExtendedException)
+    @api.errorhandler(PyJWTError)
+    def jwt_error(error):
+        handler = current_app._find_error_handler(error, request.blueprints)
+        response = current_app.make_response(handler(error))
+        return response.get_json(), response.status_code
+
     # Register API Namespaces
     api.add_namespace(auth_ns)
     api.add_namespace(cat_ns)
     api.add_namespace(prod_ns)
     api.add_namespace(inv_ns)
     api.add_namespace(rep_ns)
+    api.add_namespace(chg_ns)
 
     # Uploaded images route
     @app.route('/uploads/<filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return send_upload(filename)
+
+    # Catalog cache hit/miss counters for this worker
+    @app.route('/cache/stats')
+    @jwt_required()
+    def cache_stats():
+        return jsonify(catalog_cache.stats())
+
+    # Database reachability and connection pool usage for this worker
+    @app.route('/health/db')
+    def db_health():
+        body, status = database.health()
+        return jsonify(body), status
+
+    # Prometheus scrape target, summed over all workers sharing METRICS_DIR
+    if metrics.enabled:
+        @app.route('/metrics')
+        def prometheus_metrics():
+            return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
 
     # FRONT-END UI ROUTE
     @app.route('/minimart')
@@ -1,3 +1,129 @@
 # app/blacklist.py
+#
+# Revoked refresh-token ids. The store every worker shares is a backend (the
+# revoked_token table by default); each worker keeps a bounded LRU in front
+# of it. Access tokens are short-lived and never looked up here, so only
+# /auth/refresh and /auth/logout pay for a check.
 
-blacklist = set()
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import RevokedToken
+
+
+class DatabaseBackend:
+    """Revocations in the revoked_token table, visible to every worker."""
+
+    def add(self, jti, expires_at):
+        db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Already revoked, e.g. a retried logout
+            db.session.rollback()
+            return False
+        return True
+
+    def contains(self, jti):
+        return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+    def prune(self, now):
+        RevokedToken.query.filter(RevokedToken.expires_at < now).delete()
+        db.session.commit()
+
+
+class MemoryBackend:
+    """Per-process revocations for single-worker development setups."""
+
+    def __init__(self):
+        self._expiry = {}
+
+    def add(self, jti, expires_at):
+        if jti in self._expiry:
+            return False
+        self._expiry[jti] = expires_at
+        return True
+
+    def contains(self, jti):
+        return jti in self._expiry
+
+    def prune(self, now):
+        for jti, expires_at in list(self._expiry.items()):
+            if expires_at < now:
+                del self._expiry[jti]
+
+
+BACKENDS = {
+    "database": DatabaseBackend,
+    "memory": MemoryBackend,
+}
+
+
+class RevocationStore:
+    """Backend lookups behind a bounded, thread-safe LRU cache.
+
+    A revoked jti stays cached until evicted, since revocation is final.
+    A jti found not revoked is cached for ``negative_ttl`` seconds, which is
+    how long a logout on one worker may take to reach the others; 0 sends
+    every uncached check to the backend.
+    """
+
+    def __init__(self, backend=None, cache_size=10000, negative_ttl=5, prune_interval=3600):
+        self.backend = backend or MemoryBackend()
+        self.cache_size = cache_size
+        self.negative_ttl = negative_ttl
+        self.prune_interval = prune_interval
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def init_app(self, app):
+        self.backend = BACKENDS[app.config["JWT_REVOCATION_BACKEND"]]()
+        self.cache_size = app.config["JWT_REVOCATION_CACHE_SIZE"]
+        self.negative_ttl = app.config["JWT_REVOCATION_CACHE_TTL"]
+        self._cache.clear()
+
+    def revoke(self, jti, expires_at):
+        """Revoke ``jti`` until ``expires_at`` (a naive UTC datetime).
+
+        Returns False if it was already revoked, which is how two requests
+        racing to use one refresh token end up with only one winner.
+        """
+        added = self.backend.add(jti, expires_at)
+        self._remember(jti, True)
+        if time.monotonic() - self._last_prune > self.prune_interval:
+            self._last_prune = time.monotonic()
+            self.backend.prune(datetime.utcnow())
+        return added
+
+    def is_revoked(self, jti):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(jti)
+            if hit is not None:
+                revoked, checked_at = hit
+                if revoked or now - checked_at < self.negative_ttl:
+                    self._cache.move_to_end(jti)
+                    return revoked
+
+        revoked = self.backend.contains(jti)
+        self._remember(jti, revoked)
+        return revoked
+
+    def _remember(self, jti, revoked):
+        with self._lock:
+            self._cache[jti] = (revoked, time.monotonic())
+            self._cache.move_to_end(jti)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def __contains__(self, jti):
+        return self.is_revoked(jti)
+
+
+blacklist = RevocationStore()
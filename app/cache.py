@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from . import versions
+
+
+class LocalBackend:
+    """Thread-safe LRU with per-entry expiry, private to the worker."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache for all workers; requires the optional redis package."""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def counter(self, key):
+        return int(self._redis.get(key) or 0)
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+    def __len__(self):
+        return self._redis.dbsize()
+
+
+class CatalogCache:
+    """Serialized GET responses for the catalog endpoints.
+
+    Entries are keyed by collection version, request path, query string and
+    host (responses embed absolute image URLs). Each collection also has a
+    local generation counter baked into its list keys and each row has its
+    own, so a write invalidates every cached page of the collection plus
+    exactly the rows it touched, without scanning the cache. Writes from
+    other workers are picked up through the collection version.
+    """
+
+    def __init__(self):
+        self.backend = LocalBackend()
+        self.ttl = 60
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        # Request threads share the counters; += on an attribute is not atomic
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        if app.config["CATALOG_CACHE_BACKEND"] == "redis":
+            self.backend = RedisBackend(app.config["CATALOG_CACHE_REDIS_URL"])
+        else:
+            self.backend = LocalBackend(app.config["CATALOG_CACHE_SIZE"])
+        self.ttl = app.config["CATALOG_CACHE_TTL"]
+        self.enabled = self.ttl > 0
+        self.hits = self.misses = 0
+
+    def _key(self, collection, version, item_id):
+        if item_id is None:
+            generation = self.backend.counter(f"gen:{collection}")
+        else:
+            generation = self.backend.counter(f"gen:{collection}:{item_id}")
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{collection}:{version}.{generation}:{request.host}{request.path}?{query}"
+
+    def respond(self, collection, build, item_id=None):
+        """Serve the current GET from cache, or call ``build`` and cache it.
+
+        ``build`` returns a handler-style ``(body, status[, headers])``;
+        only 200 responses are stored. Responses carry a weak ETag naming
+        the collection version, and a matching If-None-Match is answered
+        with 304 before any query or serialization.
+        """
+        version = versions.current(collection)
+        etag = f"{collection}-{version}"
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        if not self.enabled:
+            body, status, *rest = build()
+            headers = dict(rest[0]) if rest else {}
+            if status == 200:
+                headers["ETag"] = f'W/"{etag}"'
+            return body, status, headers
+
+        key = self._key(collection, version, item_id)
+        hit = self.backend.get(key)
+        if hit is not None:
+            with self._stats_lock:
+                self.hits += 1
+            payload, headers = hit
+            return self._response(payload, headers, "HIT", etag)
+
+        with self._stats_lock:
+            self.misses += 1
+        body, status, *rest = build()
+        headers = rest[0] if rest else {}
+        if status != 200:
+            return body, status, headers
+        payload = json.dumps(body)
+        self.backend.set(key, [payload, headers], self.ttl)
+        return self._response(payload, headers, "MISS", etag)
+
+    def _response(self, payload, headers, outcome, etag):
+        response = current_app.response_class(payload, mimetype="application/json", headers=headers)
+        response.headers["X-Cache"] = outcome
+        response.set_etag(etag, weak=True)
+        return response
+
+    def invalidate(self, collection, item_ids=()):
+        """Drop every cached list of ``collection`` and the given rows."""
+        versions.forget(collection)
+        self.backend.incr(f"gen:{collection}")
+        for item_id in item_ids:
+            self.backend.incr(f"gen:{collection}:{item_id}")
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+        }
+
+
+catalog_cache = CatalogCache()
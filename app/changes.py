@@ -0,0 +1,144 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import CatalogVersion, ChangeLog
+from .versions import STAMP_BATCH, bump
+
+changes_cli = AppGroup("changes", help="Maintain the change feed.")
+
+TOPICS = ("invoices", "products")
+
+# Woken after any commit in this worker that recorded changes, so local
+# listeners see them at once; other workers' changes wait for the next poll
+_recorded = threading.Condition()
+
+
+class FeedExpired(Exception):
+    """The requested position has been pruned from the change log."""
+
+
+def record(topic, action, ids):
+    """Append one ``action`` event per id to the change log.
+
+    Runs in the caller's transaction and is a plain insert: the events get
+    their sequence numbers from stamp_pending() once committed, so writers
+    never wait on one another for a shared counter.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(ChangeLog), [
+        {"topic": topic, "action": action, "item_id": item_id, "created_at": now}
+        for item_id in ids
+    ])
+    db.session.info["changes_recorded"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_listeners(session):
+    if session.info.pop("changes_recorded", False):
+        with _recorded:
+            _recorded.notify_all()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_flag(session):
+    session.info.pop("changes_recorded", None)
+
+
+def wait_for_changes(timeout):
+    """Sleep until this worker commits a change or ``timeout`` seconds pass."""
+    with _recorded:
+        _recorded.wait(timeout)
+
+
+def stamp_pending():
+    """Number committed, unnumbered events in insertion order.
+
+    Runs in short transactions of its own, holding the 'changes' counter
+    row only while it numbers a batch. Events of a transaction that has
+    not committed yet are invisible here and numbered by a later call, so
+    sequence numbers appear in order and a resuming client never skips one.
+    """
+    pending = select(ChangeLog.id).where(ChangeLog.seq.is_(None)).order_by(ChangeLog.id).limit(STAMP_BATCH)
+    stmt = (
+        update(ChangeLog.__table__)
+        .where(ChangeLog.__table__.c.id == bindparam("row_id"))
+        .where(ChangeLog.__table__.c.seq.is_(None))
+        .values(seq=bindparam("row_seq"))
+    )
+    while True:
+        with db.engine.connect() as conn:
+            if conn.execute(pending.limit(1)).first() is None:
+                return
+        with db.engine.begin() as conn:
+            # Lock the counter before choosing events: SQLite ignores SKIP
+            # LOCKED, so this is what keeps two workers from numbering the
+            # same events
+            bump("changes", 0, conn=conn)
+            ids = conn.execute(pending.with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                return
+            first = bump("changes", len(ids), conn=conn) - len(ids) + 1
+            conn.execute(stmt, [{"row_id": row_id, "row_seq": first + i} for i, row_id in enumerate(ids)])
+        if len(ids) < STAMP_BATCH:
+            return
+
+
+def last_seq():
+    return db.session.query(CatalogVersion.version).filter_by(name="changes").scalar() or 0
+
+
+def check_position(after):
+    """Raise FeedExpired if events after ``after`` have already been pruned."""
+    oldest = db.session.query(func.min(ChangeLog.seq)).scalar()
+    if oldest is None:
+        oldest = last_seq() + 1
+    if after < oldest - 1:
+        raise FeedExpired()
+
+
+def event_to_dict(change):
+    return {"seq": change.seq, "topic": change.topic, "action": change.action, "id": change.item_id}
+
+
+def read_events(after, topics, limit):
+    """Committed events past ``after`` for ``topics``, oldest first.
+
+    Returns ``(events, cursor)``; ``cursor`` is the position to resume
+    from. When the page is not full it is the newest committed sequence
+    number, so clients filtering on a quiet topic still move forward.
+    """
+    stamp_pending()
+    high = last_seq()
+    q = ChangeLog.query.filter(ChangeLog.seq > after, ChangeLog.seq <= high)
+    if set(topics) != set(TOPICS):
+        q = q.filter(ChangeLog.topic.in_(topics))
+    rows = q.order_by(ChangeLog.seq).limit(limit).all()
+    cursor = rows[-1].seq if len(rows) == limit else max(high, after)
+    return [event_to_dict(r) for r in rows], cursor
+
+
+def sse_message(change):
+    return f"id: {change['seq']}\nevent: {change['topic']}\ndata: {json.dumps(change)}\n\n"
+
+
+@changes_cli.command("prune")
+@click.option("--days", type=int, default=None, help="Keep this many days (default CHANGE_FEED_RETENTION_DAYS).")
+def prune_command(days):
+    """Delete change log entries older than the retention window."""
+    if days is None:
+        days = current_app.config["CHANGE_FEED_RETENTION_DAYS"]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.session.execute(delete(ChangeLog).where(ChangeLog.created_at < cutoff)).rowcount
+    db.session.commit()
+    click.echo(f"Deleted {deleted} change log entries")
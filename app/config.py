@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 class Config:
     # Flask / general
@@ -6,13 +7,89 @@ class Config:
     # SQLAlchemy
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///minimart.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool, per worker process, applied by app/database.py to
+    # server databases. Size it so that workers x
+    # (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below the server's max_connections;
+    # with gthread workers, DB_POOL_SIZE should cover --threads.
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))   # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))   # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    # SQLite (local setup) has no server pool; these apply instead
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'true').lower() in ('1', 'true', 'yes')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # ms to wait for a write lock
 
     # JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret')
+    # Access tokens are checked by signature only, never against the
+    # revocation store, so a logged-out one stays usable until it expires:
+    # keep them short. Refresh tokens are checked and rotated on every use.
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 300)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(seconds=int(os.getenv('JWT_REFRESH_TOKEN_EXPIRES', 30 * 24 * 3600)))
+    # Token revocation: 'database' is shared by all workers, 'memory' is per process
+    JWT_REVOCATION_BACKEND = os.getenv('JWT_REVOCATION_BACKEND', 'database')
+    JWT_REVOCATION_CACHE_SIZE = int(os.getenv('JWT_REVOCATION_CACHE_SIZE', 10000))
+    # Seconds a "not revoked" answer is trusted before asking the backend again
+    JWT_REVOCATION_CACHE_TTL = float(os.getenv('JWT_REVOCATION_CACHE_TTL', 5))
+    # Password hashing (app/passwords.py). Stored hashes made with another
+    # method are upgraded on the user's next login. A cheaper setting such as
+    # 'scrypt:16384:8:1' halves login CPU; werkzeug's default is below.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Hashes run at once and queued per worker before logins get a 503
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+    # Seconds a successful password check is remembered (0 = never)
+    PASSWORD_VERIFY_CACHE_TTL = float(os.getenv('PASSWORD_VERIFY_CACHE_TTL', 0))
     # File uploads
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 2 * 1024 * 1024))
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     ALLOWED_IMAGE_EXTENSIONS = set(os.getenv('ALLOWED_IMAGE_EXTENSIONS', 'png,jpg,jpeg').split(','))
+    # Largest body accepted by POST /products/import
+    PRODUCT_IMPORT_MAX_BYTES = int(os.getenv('PRODUCT_IMPORT_MAX_BYTES', 200 * 1024 * 1024))
+    # Background image processing (app/jobs.py)
+    IMAGE_JOBS_ASYNC = os.getenv('IMAGE_JOBS_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+    IMAGE_JOB_WORKERS = int(os.getenv('IMAGE_JOB_WORKERS', 2))
+    IMAGE_JOB_TIMEOUT = int(os.getenv('IMAGE_JOB_TIMEOUT', 600))  # seconds before a running job is retried
+    IMAGE_JOB_RECOVER_INTERVAL = int(os.getenv('IMAGE_JOB_RECOVER_INTERVAL', 60))  # seconds between sweeps for stale jobs
+    # Serving /uploads: cache lifetime for legacy (non content-addressed) files,
+    # and optionally let the front proxy send the bytes ('x-accel' for nginx,
+    # 'x-sendfile' for Apache/lighttpd)
+    UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', 3600))
+    UPLOAD_SENDFILE_MODE = os.getenv('UPLOAD_SENDFILE_MODE')
+    UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+    USE_X_SENDFILE = UPLOAD_SENDFILE_MODE == 'x-sendfile'
+
+    # Catalog response cache (app/cache.py); TTL 0 disables it. Set the
+    # backend to 'redis' to share entries between workers.
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 60))
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 2048))
+    CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', 'local')
+    CATALOG_CACHE_REDIS_URL = os.getenv('CATALOG_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # Seconds a worker trusts its last read of a catalog version (ETags, ?since)
+    CATALOG_VERSION_TTL = float(os.getenv('CATALOG_VERSION_TTL', 1))
+
+    # Change feed (/changes): seconds between checks for other workers'
+    # writes, lifetime of one event stream, and days kept by `flask changes prune`
+    CHANGE_FEED_POLL_INTERVAL = float(os.getenv('CHANGE_FEED_POLL_INTERVAL', 1))
+    CHANGE_FEED_STREAM_TIMEOUT = int(os.getenv('CHANGE_FEED_STREAM_TIMEOUT', 300))
+    CHANGE_FEED_RETENTION_DAYS = int(os.getenv('CHANGE_FEED_RETENTION_DAYS', 7))
+    # Request/SQL instrumentation and /metrics (app/metrics.py), off by
+    # default. METRICS_DIR is a directory shared by all workers of a server,
+    # emptied on each deploy; without it /metrics only covers one worker.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+    METRICS_SLOW_QUERY_MS = float(os.getenv('METRICS_SLOW_QUERY_MS', 250))
+    # Same statement shape repeated more than this in one request is logged as a likely N+1
+    METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+    # Most periods /reports/sales zero-fills in one response (ten years of days)
+    REPORT_MAX_PERIODS = int(os.getenv('REPORT_MAX_PERIODS', 3660))
+    # Seconds a response stored for an Idempotency-Key header is replayed
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    # Seconds before a retry may take over a key whose first request never
+    # answered (a crashed worker); keep it above the slowest handler
+    IDEMPOTENCY_CLAIM_TIMEOUT = int(os.getenv('IDEMPOTENCY_CLAIM_TIMEOUT', 300))
 
     # Mail settings (for SMTP)
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -0,0 +1,110 @@
+import os
+import time
+import weakref
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from .extensions import db
+
+# Engines of every app in this process, for the fork hook below
+_engines = weakref.WeakSet()
+
+
+def _after_fork():
+    # A worker forked from a process that already connected (gunicorn
+    # --preload, a job runner) must not share those sockets with its parent.
+    # close=False leaves them to the parent and starts this pool empty.
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _sqlite_pragmas(wal, busy_timeout):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Wait for another worker's write lock instead of failing at once
+        # with "database is locked"
+        cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        if wal:
+            # Readers and the writer no longer block each other
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.close()
+    return on_connect
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``config``'s database URI.
+
+    Server databases get the DB_POOL_* settings; SQLite has no server
+    pool to size. Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    options = {}
+    if make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() != "sqlite":
+        options = {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        }
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    return options
+
+
+def init_app(app):
+    """Create the app's engines (db.init_app) and set them up.
+
+    Pool options are worked out from the final app.config, so a database
+    URI set after the Config class was loaded gets the right ones. Then
+    SQLite connections get their pragmas and every engine the post-fork
+    reset.
+    """
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    db.init_app(app)
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        _engines.add(engine)
+        if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            event.listen(engine, "connect", _sqlite_pragmas(app.config["SQLITE_WAL"], app.config["SQLITE_BUSY_TIMEOUT"]))
+
+
+def pool_status(engine):
+    """Checked-out, idle and overflow connection counts of ``engine``'s pool."""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    if "overflow" in status:
+        # QueuePool counts up from -size until the pool is full
+        status["overflow"] = max(status["overflow"], 0)
+    return status
+
+
+def health():
+    """Run ``SELECT 1`` on a pooled connection; returns ``(body, status)``.
+
+    The latency includes waiting for a free connection, so a saturated
+    pool shows up here before requests start timing out.
+    """
+    engine = db.engine
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        # The driver's message can name the host, database and user; it
+        # goes to the log, not to this unauthenticated endpoint
+        current_app.logger.exception("Database health check failed")
+        return {"status": "error", "message": "Database unavailable", "pool": pool_status(engine)}, 503
+    return {
+        "status": "ok",
+        "dialect": engine.dialect.name,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool_status(engine),
+    }, 200
@@ -0,0 +1,122 @@
+import datetime
+from sqlalchemy import func
+
+PERIODS = ("daily", "weekly", "monthly")
+
+
+def date_range(args):
+    """Read inclusive ``start``/``end`` YYYY-MM-DD dates from a query string.
+
+    Returns ``(start_dt, end_dt)`` as a half-open datetime range, either of
+    which may be None. Raises ValueError on malformed dates.
+    """
+    try:
+        start_dt = datetime.datetime.fromisoformat(args["start"]) if args.get("start") else None
+        end_dt = datetime.datetime.fromisoformat(args["end"]) + datetime.timedelta(days=1) if args.get("end") else None
+    except ValueError:
+        raise ValueError("start and end must be YYYY-MM-DD dates")
+    except OverflowError:
+        # end + 1 day is past datetime.max
+        raise ValueError("end must be before 9999-12-31")
+    return start_dt, end_dt
+
+
+def filter_created_at(q, args, column):
+    """Restrict ``q`` to rows whose ``column`` falls within the requested dates."""
+    start_dt, end_dt = date_range(args)
+    if start_dt:
+        q = q.filter(column >= start_dt)
+    if end_dt:
+        q = q.filter(column < end_dt)
+    return q
+
+
+def filter_days(q, args, column):
+    """Like filter_created_at, for a Date column such as a rollup day."""
+    start_dt, end_dt = date_range(args)
+    if start_dt:
+        q = q.filter(column >= start_dt.date())
+    if end_dt:
+        q = q.filter(column < end_dt.date())
+    return q
+
+
+def period_bucket(column, range_type, dialect_name):
+    """SQL expression labelling ``column`` with the start of its period.
+
+    Labels are YYYY-MM-DD for days and for weeks (the Monday that starts
+    the week) and YYYY-MM for months, identical on PostgreSQL and SQLite.
+    """
+    if dialect_name == "postgresql":
+        unit = {"daily": "day", "weekly": "week", "monthly": "month"}[range_type]
+        return func.to_char(func.date_trunc(unit, column), "YYYY-MM" if range_type == "monthly" else "YYYY-MM-DD")
+    if range_type == "weekly":
+        # Roll forward to Sunday, then back to the Monday of the same week
+        return func.strftime("%Y-%m-%d", column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m" if range_type == "monthly" else "%Y-%m-%d", column)
+
+
+def period_start(day, range_type):
+    """First day of the period containing ``day``."""
+    if range_type == "weekly":
+        return day - datetime.timedelta(days=day.weekday())
+    if range_type == "monthly":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(day, range_type):
+    """First day of the period following the one that starts on ``day``."""
+    if range_type == "weekly":
+        return day + datetime.timedelta(days=7)
+    if range_type == "monthly":
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def period_label(day, range_type):
+    return day.strftime("%Y-%m" if range_type == "monthly" else "%Y-%m-%d")
+
+
+def parse_period_label(label, range_type):
+    return datetime.date.fromisoformat(label + "-01" if range_type == "monthly" else label)
+
+
+def period_count(first, last, range_type):
+    """Number of periods from the one containing ``first`` through ``last``."""
+    if last < first:
+        return 0
+    if range_type == "weekly":
+        return (period_start(last, range_type) - period_start(first, range_type)).days // 7 + 1
+    if range_type == "monthly":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days + 1
+
+
+def fill_periods(totals, range_type, start_dt=None, end_dt=None, max_periods=None):
+    """Expand ``{label: total}`` to every period in range, zero where absent.
+
+    The range runs from ``start_dt`` (or the earliest label) up to, but not
+    including, ``end_dt`` (or through the latest label). Returns a list of
+    ``(label, total)`` in period order. Raises ValueError when the range
+    spans more than ``max_periods`` periods.
+    """
+    if not totals and (start_dt is None or end_dt is None):
+        return []
+    first = start_dt.date() if start_dt else parse_period_label(min(totals), range_type)
+    last = (end_dt - datetime.timedelta(days=1)).date() if end_dt else parse_period_label(max(totals), range_type)
+
+    if max_periods is not None and period_count(first, last, range_type) > max_periods:
+        raise ValueError(f"range covers more than {max_periods} {range_type} periods; narrow start/end")
+
+    result = []
+    day = period_start(first, range_type)
+    while day <= last:
+        label = period_label(day, range_type)
+        result.append((label, totals.get(label, 0)))
+        try:
+            day = next_period(day, range_type)
+        except OverflowError:
+            # The period after December 9999 is past datetime.date.max
+            break
+    return result
@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+
+from flask import Response, request, stream_with_context
+from .extensions import db
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows fetched per round trip; on PostgreSQL this also makes the driver use
+# a server-side (named) cursor instead of buffering the whole result
+BATCH_SIZE = 1000
+
+
+def export_format():
+    """Read ``format`` from the query string; raises ValueError if unknown."""
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        raise ValueError("format must be one of: csv, ndjson")
+    return fmt
+
+
+def query_batches(statement):
+    """Run ``statement`` lazily and yield its rows BATCH_SIZE at a time."""
+    result = db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+    yield from result.partitions()
+
+
+def _encode(fmt, fields, batches, to_dict):
+    if fmt == "ndjson":
+        for batch in batches:
+            yield "".join(json.dumps(to_dict(row)) + "\n" for row in batch)
+        return
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    yield buf.getvalue()
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(to_dict(row) for row in batch)
+        yield buf.getvalue()
+
+
+def stream_export(name, fmt, fields, batches, to_dict):
+    """Stream ``batches`` of rows as a CSV or NDJSON download.
+
+    ``to_dict`` turns a row into a dict keyed by ``fields``. One batch is
+    encoded at a time, so memory stays flat however large the export, and
+    with query_batches the query only runs once the client starts reading.
+    """
+    return Response(
+        stream_with_context(_encode(fmt, fields, batches, to_dict)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
@@ -0,0 +1,160 @@
+import functools
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import IdempotencyKey
+
+idempotency_cli = AppGroup("idempotency", help="Maintain stored Idempotency-Key responses.")
+
+MAX_KEY_LENGTH = 255
+
+
+def _scope():
+    # Keys are per user so one client can never replay another's response
+    try:
+        return str(get_jwt_identity() or "")
+    except RuntimeError:
+        return ""
+
+
+def _fingerprint():
+    # Keyed with SECRET_KEY: bodies may carry passwords
+    digest = hmac.new(current_app.config["SECRET_KEY"].encode(), digestmod=hashlib.sha256)
+    for part in (request.method, request.full_path, request.mimetype):
+        digest.update(part.encode() + b"\0")
+    if request.mimetype == "multipart/form-data":
+        # A retried upload gets a new boundary, so hash the parsed parts
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}".encode() + b"\0")
+        for name, upload in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"{name}:{upload.filename}".encode() + b"\0")
+            digest.update(upload.stream.read())
+            upload.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _unpack(result):
+    if not isinstance(result, tuple):
+        return result, 200, {}
+    return result[0], result[1] if len(result) > 1 else 200, result[2] if len(result) > 2 else {}
+
+
+def _replay(record):
+    headers = json.loads(record.response_headers or "{}")
+    headers["Idempotent-Replayed"] = "true"
+    return json.loads(record.response_body), record.status_code, headers
+
+
+def idempotent(fn):
+    """Honour an ``Idempotency-Key`` header on a POST/PUT handler.
+
+    The first request with a key runs normally and its response is stored
+    for IDEMPOTENCY_KEY_TTL seconds; a retry with the same key and the same
+    request gets the stored response back after one indexed lookup, without
+    running the handler again. Reusing a key for a different request is a
+    422, and a retry that arrives while the first is still running is a 409;
+    once IDEMPOTENCY_CLAIM_TIMEOUT seconds have passed without a response
+    (say the worker died), a retry takes the key over and runs the handler.
+    Responses with a 5xx status or a 409 (out of stock, conflicting
+    writes) and raised errors are not stored, so those can be retried.
+    Requests without the header are unaffected.
+
+    Place it below @jwt_required() so keys are scoped to the caller.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return {"message": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}, 400
+
+        scope, fingerprint, now = _scope(), _fingerprint(), datetime.utcnow()
+        record = IdempotencyKey.query.filter_by(scope=scope, key=key).first()
+        if record and record.expires_at <= now:
+            db.session.delete(record)
+            db.session.flush()
+            record = None
+        if record:
+            if record.request_hash != fingerprint:
+                return {"message": "Idempotency-Key was already used for a different request"}, 422
+            if record.status_code is not None:
+                return _replay(record)
+            # Take over a claim whose request never finished; the
+            # conditional UPDATE lets only one retry win it
+            stale = now - timedelta(seconds=current_app.config["IDEMPOTENCY_CLAIM_TIMEOUT"])
+            taken = db.session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.id == record.id, IdempotencyKey.status_code.is_(None),
+                       or_(IdempotencyKey.claimed_at.is_(None), IdempotencyKey.claimed_at < stale))
+                .values(claimed_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not taken:
+                db.session.rollback()
+                return {"message": "A request with this Idempotency-Key is still in progress"}, 409
+            record_id = record.id
+            db.session.commit()
+        else:
+            # Claim the key before running the handler; the unique (scope, key)
+            # index turns a concurrent duplicate into an IntegrityError
+            record = IdempotencyKey(
+                scope=scope,
+                key=key,
+                request_hash=fingerprint,
+                claimed_at=now,
+                expires_at=now + timedelta(seconds=current_app.config["IDEMPOTENCY_KEY_TTL"]),
+            )
+            db.session.add(record)
+            try:
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                return {"message": "A request with this Idempotency-Key is still in progress"}, 409
+            record_id = record.id
+            db.session.commit()
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+            db.session.commit()
+            raise
+
+        # Whatever the handler left uncommitted (a 4xx after partial changes)
+        # is discarded, as it would be at teardown without the header
+        db.session.rollback()
+        body, status, headers = _unpack(result)
+        if status >= 500 or status == 409 or not isinstance(body, (dict, list)):
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+        else:
+            IdempotencyKey.query.filter_by(id=record_id).update({
+                "status_code": status,
+                "response_body": json.dumps(body),
+                "response_headers": json.dumps(dict(headers)),
+            })
+        db.session.commit()
+        return result
+
+    return wrapper
+
+
+@idempotency_cli.command("prune")
+def prune_command():
+    """Delete expired Idempotency-Key records."""
+    deleted = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())).rowcount
+    db.session.commit()
+    click.echo(f"Deleted {deleted} expired idempotency keys")
@@ -0,0 +1,213 @@
+import contextlib
+import functools
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+from flask import abort, current_app, request, send_file, url_for
+from werkzeug.security import safe_join
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+from .models import Product
+
+try:
+    import fcntl
+except ImportError:  # Windows: image_lock() does not lock
+    fcntl = None
+
+# Longest edge, in pixels, of each stored rendition. Uploads smaller than a
+# size are not upscaled.
+VARIANTS = (
+    ("large", 1280),
+    ("medium", 480),
+    ("thumb", 160),
+)
+
+# Processed images are named <sha256 of the upload>.<ext>; anything else in
+# Product.image_filename is a legacy upload stored verbatim.
+PROCESSED_NAME = re.compile(r"^([0-9a-f]{64})\.(webp|jpg)$")
+
+# Any stored rendition; its content never changes for a given name
+RENDITION_NAME = re.compile(r"^([0-9a-f]{64})(_[a-z]+)?\.(webp|jpg)$")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _output_format():
+    return ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+
+def variant_filename(digest, size_name, ext):
+    return f"{digest}.{ext}" if size_name == "large" else f"{digest}_{size_name}.{ext}"
+
+
+def image_name(raw):
+    """Filename store_image() gives ``raw``, without decoding it."""
+    return variant_filename(hashlib.sha256(raw).hexdigest(), "large", _output_format()[1])
+
+
+@contextlib.contextmanager
+def image_lock(filename):
+    """Exclusive lock on a processed image's files, shared by all workers.
+
+    Hold it from store_image() until the product referring to the result
+    is committed; release_image() takes it to check references and delete,
+    so it cannot remove renditions another upload has just reused. Legacy
+    filenames (and None) are not shared and are not locked.
+    """
+    match = PROCESSED_NAME.match(filename or "")
+    if not match or fcntl is None:
+        yield
+        return
+    # 256 lock files, picked by the first two hex digits of the hash
+    folder = os.path.join(current_app.config["UPLOAD_FOLDER"], ".locks")
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, match.group(1)[:2]), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def store_image(raw):
+    """Decode uploaded bytes once and store their renditions under their hash.
+
+    Returns the filename to keep in Product.image_filename. Identical
+    uploads map to the same files, so a repeated image costs one hash and
+    no re-encoding. Raises ValueError if the bytes are not a readable image.
+    """
+    digest = hashlib.sha256(raw).hexdigest()
+    fmt, ext = _output_format()
+    folder = current_app.config["UPLOAD_FOLDER"]
+    filename = variant_filename(digest, "large", ext)
+
+    if all(os.path.exists(os.path.join(folder, variant_filename(digest, name, ext))) for name, _ in VARIANTS):
+        return filename
+
+    try:
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+        img = ImageOps.exif_transpose(img)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("Invalid image")
+
+    if fmt == "JPEG" or img.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if fmt == "WEBP" and has_alpha else "RGB")
+
+    # Each rendition is shrunk from the previous, larger one
+    for name, size in VARIANTS:
+        img.thumbnail((size, size), Image.LANCZOS)
+        _save_atomic(img, os.path.join(folder, variant_filename(digest, name, ext)), fmt)
+    return filename
+
+
+def _save_atomic(img, path, fmt):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            if fmt == "WEBP":
+                img.save(fh, fmt, quality=80, method=4)
+            else:
+                img.save(fh, fmt, quality=82, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def image_urls(filename):
+    """URLs of every stored rendition of ``filename``, keyed by size name."""
+    if not filename:
+        return None
+    match = PROCESSED_NAME.match(filename)
+    if not match:
+        url = url_for("uploaded_file", filename=filename, _external=True)
+        return {name: url for name, _ in VARIANTS}
+    digest, ext = match.groups()
+    return {
+        name: url_for("uploaded_file", filename=variant_filename(digest, name, ext), _external=True)
+        for name, _ in VARIANTS
+    }
+
+
+def delete_image(filename):
+    """Remove ``filename`` and its renditions from the upload folder."""
+    folder = current_app.config["UPLOAD_FOLDER"]
+    match = PROCESSED_NAME.match(filename)
+    names = [variant_filename(match.group(1), name, match.group(2)) for name, _ in VARIANTS] if match else [filename]
+    for name in names:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def release_image(filename):
+    """Delete ``filename``'s files once no product refers to them any more.
+
+    Content-addressed images can be shared by several products, so call
+    this after committing the change that dropped the reference.
+    """
+    if not filename:
+        return
+    with image_lock(filename):
+        if not Product.query.filter_by(image_filename=filename).first():
+            delete_image(filename)
+
+
+@functools.lru_cache(maxsize=1024)
+def _file_digest(path, mtime_ns, size):
+    # Keyed on mtime and size so a replaced legacy file is hashed again
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def send_upload(filename):
+    """Serve an uploaded file with a strong ETag and long-lived caching.
+
+    Renditions are named after their content hash, so the name is the
+    ETag and the response is immutable. Legacy uploads are hashed once per
+    version of the file. If-None-Match / If-Modified-Since are answered with
+    304 and Range requests with 206. With UPLOAD_SENDFILE_MODE set to
+    "x-accel", the body is left to the front proxy via X-Accel-Redirect;
+    with "x-sendfile", Flask emits X-Sendfile instead of streaming.
+    """
+    path = safe_join(current_app.config["UPLOAD_FOLDER"], filename)
+    if path is None:
+        abort(404)
+    # send_file() resolves relative paths against the app package, not the
+    # working directory the files were written to
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+
+    rendition = RENDITION_NAME.match(filename)
+    if rendition:
+        etag = filename.rsplit(".", 1)[0]
+        max_age = IMMUTABLE_MAX_AGE
+    else:
+        etag = _file_digest(path, stat.st_mtime_ns, stat.st_size)
+        max_age = current_app.config["UPLOAD_MAX_AGE"]
+
+    if current_app.config["UPLOAD_SENDFILE_MODE"] == "x-accel":
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        )
+        response.headers["X-Accel-Redirect"] = current_app.config["UPLOAD_ACCEL_PREFIX"].rstrip("/") + "/" + filename
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.make_conditional(request)
+    else:
+        response = send_file(path, etag=etag, max_age=max_age, last_modified=stat.st_mtime, conditional=True)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if rendition:
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,188 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .changes import record
+from .extensions import db
+from .models import Category, Product
+from .versions import bump
+
+# Rows per upsert statement and per commit
+BATCH_SIZE = 1000
+
+# Per-row errors reported back; the rest are only counted
+MAX_ERRORS = 1000
+
+PRODUCTS = Product.__table__
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, dict)`` pairs from an uploaded CSV or NDJSON body.
+
+    The body is decoded as it is read, so an import never holds more than
+    one line of input in memory. A line that cannot be parsed at all is
+    yielded with a ValueError in place of the dict.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for raw in reader:
+            yield reader.line_num, raw
+        return
+
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            raw = ValueError(f"Invalid JSON: {e}")
+        yield line_no, raw
+
+
+def clean_row(raw, category_ids):
+    """Validate one input row into Product column values; raises ValueError."""
+    sku = str(raw.get("sku") or "").strip()
+    if not sku or len(sku) > 64:
+        raise ValueError("sku is required (at most 64 characters)")
+    name = str(raw.get("name") or "").strip()
+    if not name or len(name) > 200:
+        raise ValueError("name is required (at most 200 characters)")
+    try:
+        price_cents = int(round(float(raw.get("price")) * 100))
+    except (TypeError, ValueError):
+        raise ValueError("price must be a number")
+    # None when the column is missing or blank: existing stock is kept
+    quantity = raw.get("quantity")
+    try:
+        quantity = int(quantity) if quantity not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError("quantity must be an integer")
+    try:
+        category_id = int(raw.get("category_id"))
+    except (TypeError, ValueError):
+        raise ValueError("category_id must be an integer")
+    if price_cents < 0 or (quantity or 0) < 0:
+        raise ValueError("price and quantity must not be negative")
+    if category_id not in category_ids:
+        raise ValueError(f"Invalid category_id: {category_id}")
+    return {
+        "sku": sku,
+        "name": name,
+        "description": raw.get("description") or None,
+        "price_cents": price_cents,
+        "quantity": quantity,
+        "category_id": category_id,
+    }
+
+
+def upsert_batch(rows):
+    """Insert or update one batch of products by SKU and commit it.
+
+    One SELECT tells new SKUs from existing ones, then
+    ``INSERT ... ON CONFLICT (sku) DO UPDATE`` writes the batch: one
+    statement for rows with a quantity and one for rows without, which
+    leave an existing product's stock (kept by sales, app/stock.py) alone
+    and create new products with none. Returns ``(created, updated)`` counts.
+    """
+    existing = set(db.session.execute(
+        select(Product.sku).where(Product.sku.in_([r["sku"] for r in rows]))
+    ).scalars())
+    version = bump("products")
+
+    dialect_insert = postgresql.insert if db.session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    ids = {}
+    for with_quantity in (True, False):
+        group = [r for r in rows if (r["quantity"] is not None) == with_quantity]
+        if not group:
+            continue
+        columns = ("name", "description", "price_cents", "category_id", "version") + (("quantity",) if with_quantity else ())
+        stmt = dialect_insert(PRODUCTS)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PRODUCTS.c.sku],
+            set_={col: stmt.excluded[col] for col in columns},
+        ).returning(PRODUCTS.c.id, PRODUCTS.c.sku)
+        values = [dict(r, version=version, quantity=r["quantity"] or 0) for r in group]
+        ids.update((sku, pid) for pid, sku in db.session.execute(stmt, values))
+
+    record("products", "create", [ids[r["sku"]] for r in rows if r["sku"] not in existing])
+    record("products", "update", [ids[r["sku"]] for r in rows if r["sku"] in existing])
+    db.session.commit()
+    return len(rows) - len(existing), len(existing)
+
+
+def import_products(stream, fmt):
+    """Stream a CSV/NDJSON product file into the catalog.
+
+    Valid rows are upserted by SKU, BATCH_SIZE at a time with a commit per
+    batch; invalid rows are skipped and reported by line number. Category
+    ids are checked against a set loaded once up front. Within a batch the
+    last row for a SKU wins. If the body stops being readable CSV/UTF-8,
+    the report gets an ``aborted`` message and the rest is skipped. A
+    batch the database rejects (say its category was deleted meanwhile)
+    is reported row by row in ``errors``, like an invalid row.
+    """
+    category_ids = set(db.session.execute(select(Category.id)).scalars())
+    report = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = {}
+
+    def fail(line, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_ERRORS:
+            report["errors"].append({"line": line, "message": message})
+
+    def flush():
+        entries = list(batch.values())
+        batch.clear()
+        try:
+            created, updated = upsert_batch([row for _, row in entries])
+        except IntegrityError:
+            # Typically a category deleted since the import started. Earlier
+            # batches are committed; this one is retried without the rows
+            # whose category is gone, and reported as failed if it still
+            # cannot be written.
+            db.session.rollback()
+            category_ids.clear()
+            category_ids.update(db.session.execute(select(Category.id)).scalars())
+            kept = []
+            for line, row in entries:
+                if row["category_id"] in category_ids:
+                    kept.append((line, row))
+                else:
+                    fail(line, f"Invalid category_id: {row['category_id']}")
+            if not kept:
+                return
+            try:
+                created, updated = upsert_batch([row for _, row in kept])
+            except IntegrityError:
+                db.session.rollback()
+                for line, _ in kept:
+                    fail(line, "Not imported: the batch conflicts with a concurrent change")
+                return
+        report["created"] += created
+        report["updated"] += updated
+
+    line = 0
+    try:
+        for line, raw in read_rows(stream, fmt):
+            try:
+                if isinstance(raw, ValueError):
+                    raise raw
+                row = clean_row(raw, category_ids)
+            except ValueError as e:
+                fail(line, str(e))
+                continue
+            batch[row["sku"]] = (line, row)
+            if len(batch) >= BATCH_SIZE:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Rows read so far are still imported; the rest of the file is not
+        report["aborted"] = f"Unreadable input after line {line}: {e}"
+    if batch:
+        flush()
+    return report
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, update
+
+from .cache import catalog_cache
+from .changes import record
+from .extensions import db
+from .images import image_lock, image_name, release_image, store_image
+from .models import ImageJob, Product
+from .versions import bump
+
+images_cli = AppGroup("images", help="Background image processing.")
+
+
+class ImageJobQueue:
+    """Image processing off the request thread.
+
+    Raw uploads are staged on disk and recorded as ImageJob rows in the
+    same transaction as the product change, then handed to a small thread
+    pool. A job is claimed with a conditional UPDATE before it runs, so
+    every gunicorn worker can safely pick up jobs left behind by a crash or
+    restart; each worker looks for them on its first request and then every
+    IMAGE_JOB_RECOVER_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._last_recover = None
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self._maybe_recover)
+
+    def _maybe_recover(self):
+        if not self.app.config["IMAGE_JOBS_ASYNC"]:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._last_recover is not None and now - self._last_recover < self.app.config["IMAGE_JOB_RECOVER_INTERVAL"]:
+                return
+            self._last_recover = now
+        self._pool().submit(self.recover)
+
+    def stage(self, product, file_storage):
+        """Save an upload for ``product`` and queue a job in the current session.
+
+        Marks the product pending. The caller commits, then calls submit().
+        """
+        folder = os.path.join(current_app.config["UPLOAD_FOLDER"], "incoming")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, uuid.uuid4().hex)
+        file_storage.save(path)
+
+        product.image_status = "pending"
+        job = ImageJob(product_id=product.id, source_path=path)
+        db.session.add(job)
+        db.session.flush()
+        return job.id
+
+    def submit(self, job_id):
+        """Queue the job, or run it right away without IMAGE_JOBS_ASYNC.
+
+        Returns True if it has already run.
+        """
+        if not self.app.config["IMAGE_JOBS_ASYNC"]:
+            self.run(job_id)
+            return True
+        self._pool().submit(self.run, job_id)
+        return False
+
+    def _pool(self):
+        # Started on first use so the threads belong to the forked worker
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config["IMAGE_JOB_WORKERS"],
+                    thread_name_prefix="image-jobs",
+                )
+            return self._executor
+
+    def recover(self):
+        """Requeue stale running jobs and submit every queued one."""
+        with self.app.app_context():
+            stale = datetime.utcnow() - timedelta(seconds=self.app.config["IMAGE_JOB_TIMEOUT"])
+            db.session.execute(
+                update(ImageJob)
+                .where(ImageJob.status == "running", ImageJob.updated_at < stale)
+                .values(status="queued")
+            )
+            db.session.commit()
+            job_ids = [row[0] for row in db.session.query(ImageJob.id).filter_by(status="queued").order_by(ImageJob.id)]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def run(self, job_id):
+        with self.app.app_context():
+            try:
+                self._process(job_id)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Image job %s failed", job_id)
+                ImageJob.query.filter_by(id=job_id).update({"status": "failed", "error": "Internal error"})
+                db.session.commit()
+
+    def _process(self, job_id):
+        claimed = db.session.execute(
+            update(ImageJob)
+            .where(ImageJob.id == job_id, ImageJob.status == "queued")
+            .values(status="running", attempts=ImageJob.attempts + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = db.session.get(ImageJob, job_id)
+        filename, error, raw = None, None, None
+        try:
+            with open(job.source_path, "rb") as fh:
+                raw = fh.read()
+        except OSError as e:
+            error = str(e)
+
+        # Held until the new reference is committed, so release_image() in
+        # another worker cannot delete renditions store_image() just reused
+        with image_lock(image_name(raw) if raw is not None else None):
+            if raw is not None:
+                try:
+                    filename = store_image(raw)
+                except (ValueError, OSError) as e:
+                    error = str(e)
+
+            # Only the newest upload for a product may change its image
+            latest = db.session.query(func.max(ImageJob.id)).filter_by(product_id=job.product_id).scalar()
+            product = db.session.get(Product, job.product_id)
+            applied = product is not None and latest == job.id
+            old_image = None
+            if applied:
+                old_image = product.image_filename
+                if filename:
+                    product.image_filename = filename
+                    product.image_status = "ready"
+                else:
+                    product.image_status = "failed"
+                product.version = bump("products")
+                record("products", "update", [product.id])
+            job.status = "done" if filename else "failed"
+            job.error = error
+            job.updated_at = datetime.utcnow()
+            source_path, product_id = job.source_path, job.product_id
+            db.session.commit()
+        if applied:
+            catalog_cache.invalidate("products", [product_id])
+
+        if os.path.exists(source_path):
+            os.remove(source_path)
+        if old_image and old_image != filename:
+            release_image(old_image)
+        if filename and not applied:
+            release_image(filename)
+
+
+image_jobs = ImageJobQueue()
+
+
+@images_cli.command("drain")
+def drain_command():
+    """Process every queued image job in this process, then exit."""
+    async_mode = current_app.config["IMAGE_JOBS_ASYNC"]
+    current_app.config["IMAGE_JOBS_ASYNC"] = False
+    try:
+        count = image_jobs.recover()
+    finally:
+        current_app.config["IMAGE_JOBS_ASYNC"] = async_mode
+    click.echo(f"Processed {count} image jobs")
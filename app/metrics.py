@@ -0,0 +1,212 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from .extensions import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+HELP = {
+    "minimart_http_request_duration_seconds": ("histogram", "Time to produce a response (streamed bodies: first byte)."),
+    "minimart_db_queries_per_request": ("histogram", "SQL statements executed per request."),
+    "minimart_db_time_seconds_total": ("counter", "Time spent in SQL statements, by route."),
+    "minimart_db_slow_queries_total": ("counter", "Statements slower than METRICS_SLOW_QUERY_MS."),
+    "minimart_db_n_plus_one_total": ("counter", "Requests repeating one statement shape more than METRICS_N_PLUS_ONE_THRESHOLD times."),
+}
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)*\)")
+
+
+def statement_shape(statement):
+    """``statement`` with every placeholder as ``?`` and IN lists as ``(?)``."""
+    return _PLACEHOLDER_LIST.sub("(?)", _PLACEHOLDER.sub("?", statement))
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """Per-route latency, SQL counts and N+1 detection for one worker.
+
+    Off unless METRICS_ENABLED. Each worker keeps its own totals and, when
+    METRICS_DIR is set, writes them to a file there at most once per
+    METRICS_FLUSH_INTERVAL; /metrics adds up every worker's file, so any
+    worker can answer a scrape for the whole server.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._last_flush = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config["METRICS_ENABLED"]
+        if not self.enabled:
+            return
+        self.directory = app.config["METRICS_DIR"]
+        self.flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        self.slow_query = app.config["METRICS_SLOW_QUERY_MS"] / 1000
+        self.n_plus_one = app.config["METRICS_N_PLUS_ONE_THRESHOLD"]
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _count(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def _observe(self, name, labels, value, buckets):
+        with self._lock:
+            hist = self._histograms.get((name, labels))
+            if hist is None:
+                hist = self._histograms[(name, labels)] = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0, "count": 0}
+            for i, bound in enumerate(hist["buckets"]):
+                if value <= bound:
+                    hist["counts"][i] += 1
+                    break
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def _route(self):
+        # The rule, not the path, keeps label cardinality bounded
+        return request.url_rule.rule if request.url_rule else "unmatched"
+
+    def _before_request(self):
+        g.metrics = {"started": time.perf_counter(), "queries": 0, "db_time": 0.0, "shapes": Counter()}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        current = g.get("metrics") if has_request_context() else None
+        if current is not None:
+            current["queries"] += 1
+            current["db_time"] += elapsed
+            current["shapes"][statement_shape(statement)] += 1
+        if elapsed >= self.slow_query:
+            route = self._route() if has_request_context() else "-"
+            self._count("minimart_db_slow_queries_total", _labels(route=route))
+            # Parameters are left out: they can hold passwords and tokens
+            current_app.logger.warning("Slow query (%.0f ms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:1000])
+
+    def _after_request(self, response):
+        current = g.pop("metrics", None)
+        if current is None:
+            return response
+        route = self._route()
+        elapsed = time.perf_counter() - current["started"]
+        self._observe("minimart_http_request_duration_seconds",
+                      _labels(method=request.method, route=route, status=response.status_code), elapsed, LATENCY_BUCKETS)
+        self._observe("minimart_db_queries_per_request", _labels(route=route), current["queries"], QUERY_COUNT_BUCKETS)
+        self._count("minimart_db_time_seconds_total", _labels(route=route), current["db_time"])
+
+        if current["shapes"]:
+            shape, repeats = current["shapes"].most_common(1)[0]
+            if repeats > self.n_plus_one:
+                self._count("minimart_db_n_plus_one_total", _labels(route=route))
+                current_app.logger.warning("Possible N+1 on %s %s: %d x %s", request.method, route, repeats, " ".join(shape.split())[:1000])
+
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return response
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, labels, dict(hist, counts=list(hist["counts"]))] for (name, labels), hist in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this worker's totals to METRICS_DIR."""
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.directory, f"worker-{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp, path)
+
+    def _collect(self):
+        if not self.directory:
+            return [self._snapshot()]
+        # Files of exited workers stay, so totals never go backwards
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Every worker's totals in the Prometheus text format."""
+        counters, histograms = {}, {}
+        for snapshot in self._collect():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, hist in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, {"buckets": hist["buckets"], "counts": [0] * len(hist["buckets"]), "sum": 0, "count": 0})
+                total["counts"] = [a + b for a, b in zip(total["counts"], hist["counts"])]
+                total["sum"] += hist["sum"]
+                total["count"] += hist["count"]
+
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "counter":
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(hist["buckets"], hist["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+if hasattr(os, "register_at_fork"):
+    # A forked worker starts from zero rather than a copy of its parent's totals
+    os.register_at_fork(after_in_child=metrics.reset)
@@ -14,18 +14,34 @@ class Category(db.Model):
     name = db.Column(db.String(120), unique=True, nullable=False)
     description = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # catalog_version of the last write to this row (app/versions.py)
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
+    # Supplier stock-keeping unit; the upsert key for bulk imports (app/imports.py)
+    sku = db.Column(db.String(64), unique=True, index=True)
     price_cents = db.Column(db.Integer, nullable=False, default=0)
     quantity = db.Column(db.Integer, default=0)
     image_filename = db.Column(db.String(255))
+    # None without an image, else pending | ready | failed (see app/jobs.py)
+    image_status = db.Column(db.String(20))
+    # catalog_version of the last write to this row (app/versions.py); 0
+    # after a stock move until the next reader stamps it
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     category = db.relationship('Category', backref=db.backref('products', lazy=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination seeks on (filter column, id) for the product listing
+        db.Index('ix_product_category_id_id', 'category_id', 'id'),
+        db.Index('ix_product_price_cents_id', 'price_cents', 'id'),
+        db.Index('ix_product_name', 'name'),
+    )
+
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(200))
@@ -34,14 +50,90 @@ class Invoice(db.Model):
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_by = db.relationship('User')
     total_cents = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Client-chosen id of the sale (e.g. from an offline till) so a resubmission is recognised
+    idempotency_key = db.Column(db.String(100), unique=True, index=True)
     items = db.relationship('InvoiceItem', backref='invoice', cascade='all, delete-orphan', lazy=True)
 
 class InvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     product = db.relationship('Product')
     quantity = db.Column(db.Integer, nullable=False)
     unit_price_cents = db.Column(db.Integer, nullable=False)
     subtotal_cents = db.Column(db.Integer, nullable=False)
+    # The product's category at the time of sale, so the rollup key of a
+    # line never changes when the product is re-categorized or deleted
+    category_id = db.Column(db.Integer)
+
+class DailySalesRollup(db.Model):
+    # Sales pre-aggregated per day x product x category x user, maintained
+    # by app/rollup.py. Missing categories and users are stored as 0 so the
+    # whole key can be a primary key and upserted in one statement.
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue_cents = db.Column(db.Integer, nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+
+class RevokedToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ImageJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False, index=True)
+    source_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CatalogVersion(db.Model):
+    # One monotonically increasing counter per catalog collection, plus
+    # 'changes' for ChangeLog.seq
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CatalogTombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    collection = db.Column(db.String(50), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_catalog_tombstone_collection_version', 'collection', 'version'),
+    )
+
+class ChangeLog(db.Model):
+    # Append-only feed of invoice/product writes (app/changes.py)
+    id = db.Column(db.Integer, primary_key=True)
+    # Feed position, assigned after commit by the first reader; None until then
+    seq = db.Column(db.Integer, unique=True, index=True)
+    topic = db.Column(db.String(20), nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # create | update | delete
+    item_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class IdempotencyKey(db.Model):
+    # Stored responses for the Idempotency-Key header (app/idempotency.py)
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(80), nullable=False, default='')  # user id, '' when anonymous
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # None while the first request is running
+    claimed_at = db.Column(db.DateTime)  # when that request started; a stale claim can be taken over
+    response_body = db.Column(db.Text)
+    response_headers = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_scope_key', 'scope', 'key', unique=True),
+    )
@@ -0,0 +1,86 @@
+from flask import request
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_args():
+    """Read ``limit`` and ``after`` from the query string.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = request.args.get("after")
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            raise ValueError("after must be an integer cursor")
+    return limit, after
+
+
+def keyset_page(query, key, after, limit):
+    """Fetch one page of ``query`` ordered by ``key``, starting after ``after``.
+
+    One extra row is fetched to know whether another page exists, so the
+    cost of a page is a single index range scan whatever the table size.
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    if after is not None:
+        query = query.filter(key > after)
+    rows = query.order_by(key).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], key.key)
+    return rows, next_cursor
+
+
+def page_headers(next_cursor):
+    """Response headers advertising the cursor of the next page, if any."""
+    if next_cursor is None:
+        return {}
+    return {"X-Next-Cursor": str(next_cursor)}
+
+
+def offset_args():
+    """Read ``limit`` and ``offset`` from the query string.
+
+    For result sets with no stable key to seek on, such as aggregated report
+    rows ordered by total. Raises ValueError on bad input.
+    """
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    return limit, offset
+
+
+def offset_page(query, limit, offset):
+    """Fetch one page of an already ordered query.
+
+    Returns ``(rows, next_offset)``; ``next_offset`` is None on the last page.
+    """
+    rows = query.limit(limit + 1).offset(offset).all()
+    if len(rows) > limit:
+        return rows[:limit], offset + limit
+    return rows, None
+
+
+def offset_headers(next_offset):
+    """Response headers advertising the offset of the next page, if any."""
+    if next_offset is None:
+        return {}
+    return {"X-Next-Offset": str(next_offset)}
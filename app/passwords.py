@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Successful checks remembered at most, when PASSWORD_VERIFY_CACHE_TTL is set
+VERIFY_CACHE_SIZE = 10000
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already running or queued in this worker."""
+
+
+class PasswordHasher:
+    """Password hashing and checking on a small, bounded thread pool.
+
+    At most PASSWORD_HASH_WORKERS hashes run at once per worker (scrypt
+    holds 32 MB while it runs) and PASSWORD_HASH_QUEUE more may wait; past
+    that, hash() and verify() raise HasherBusy straight away so a login
+    storm gets quick 503s instead of piling up memory and timeouts.
+    hashlib releases the GIL while hashing, so the pool threads use every
+    core while request threads keep serving other endpoints.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        # Stored hashes carry werkzeug's full parameters ('scrypt' is stored
+        # as 'scrypt:32768:8:1'); hashing once also rejects a bad method early
+        self.prefix = generate_password_hash("x", self.method).split("$", 1)[0]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.cache_ttl = app.config["PASSWORD_VERIFY_CACHE_TTL"]
+        self.secret = app.config["SECRET_KEY"].encode()
+        self._slots = threading.BoundedSemaphore(self.workers + app.config["PASSWORD_HASH_QUEUE"])
+        self._recent.clear()
+
+    def _pool(self):
+        # Started on first use so the threads belong to the forked worker
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash ``password`` with PASSWORD_HASH_METHOD; raises HasherBusy."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, stored):
+        """True if ``stored`` was made with other parameters than the current ones."""
+        return stored.split("$", 1)[0] != self.prefix
+
+    def verify(self, stored, password):
+        """Check ``password`` against the ``stored`` hash; raises HasherBusy.
+
+        With PASSWORD_VERIFY_CACHE_TTL set, a successful check is remembered
+        that long as a keyed digest of (stored hash, password), so a till
+        logging in again skips the slow hash. The password itself is never
+        kept, and a new stored hash (password change, rehash) misses.
+        """
+        key = None
+        if self.cache_ttl > 0:
+            key = hmac.new(self.secret, stored.encode() + b"\0" + password.encode(), hashlib.sha256).digest()
+            with self._lock:
+                expires = self._recent.get(key)
+            if expires and expires > time.monotonic():
+                return True
+
+        ok = self._run(check_password_hash, stored, password)
+        if ok and key:
+            with self._lock:
+                self._recent[key] = time.monotonic() + self.cache_ttl
+                self._recent.move_to_end(key)
+                while len(self._recent) > VERIFY_CACHE_SIZE:
+                    self._recent.popitem(last=False)
+        return ok
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,133 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from .extensions import db
+from .models import DailySalesRollup, Invoice, InvoiceItem
+
+rollup_cli = AppGroup("rollup", help="Maintain the daily sales rollup.")
+
+ROLLUP = DailySalesRollup.__table__
+
+
+def _dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def rollup_day(column, dialect_name):
+    """SQL expression for the calendar day of a timestamp column."""
+    if dialect_name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def apply_invoice(invoice, sign):
+    """Add (sign=1) or remove (sign=-1) one invoice's lines in the rollup.
+
+    Lines are keyed on the category stored with each item at sale time, so
+    a reversal always hits the row the sale was added to. Reads the
+    invoice's current items, so call it after inserting items on
+    create and before deleting them on update/delete. Costs one SELECT and
+    one upsert, in the caller's transaction.
+    """
+    apply_invoices([invoice.id], sign)
+
+
+def apply_invoices(invoice_ids, sign):
+    """apply_invoice for many invoices, still in one SELECT and one upsert."""
+    lines = (
+        db.session.query(
+            Invoice.created_at,
+            Invoice.created_by_id,
+            InvoiceItem.product_id,
+            InvoiceItem.category_id,
+            func.sum(InvoiceItem.quantity),
+            func.sum(InvoiceItem.subtotal_cents),
+        )
+        .join(Invoice, InvoiceItem.invoice_id == Invoice.id)
+        .filter(InvoiceItem.invoice_id.in_(invoice_ids))
+        .group_by(InvoiceItem.invoice_id, Invoice.created_at, Invoice.created_by_id,
+                  InvoiceItem.product_id, InvoiceItem.category_id)
+        .all()
+    )
+
+    # Each result row is one invoice's share of a rollup key; invoices on
+    # the same day and products are merged so every key is upserted once
+    deltas = {}
+    for created_at, user_id, product_id, category_id, quantity, revenue_cents in lines:
+        key = (created_at.date(), product_id or 0, category_id or 0, user_id or 0)
+        row = deltas.setdefault(key, [0, 0, 0])
+        row[0] += quantity
+        row[1] += revenue_cents
+        row[2] += 1
+    if not deltas:
+        return
+
+    upsert_rows([
+        {
+            "day": day,
+            "product_id": product_id,
+            "category_id": category_id,
+            "user_id": user_id,
+            "quantity": sign * quantity,
+            "revenue_cents": sign * revenue_cents,
+            "invoice_count": sign * invoice_count,
+        }
+        for (day, product_id, category_id, user_id), (quantity, revenue_cents, invoice_count) in deltas.items()
+    ])
+
+
+def upsert_rows(rows):
+    """Add rollup deltas, creating missing rows, with INSERT ... ON CONFLICT."""
+    dialect_insert = postgresql.insert if _dialect_name() == "postgresql" else sqlite.insert
+    stmt = dialect_insert(ROLLUP)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ROLLUP.c.day, ROLLUP.c.product_id, ROLLUP.c.category_id, ROLLUP.c.user_id],
+        set_={
+            "quantity": ROLLUP.c.quantity + stmt.excluded.quantity,
+            "revenue_cents": ROLLUP.c.revenue_cents + stmt.excluded.revenue_cents,
+            "invoice_count": ROLLUP.c.invoice_count + stmt.excluded.invoice_count,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
+def rebuild_statement(dialect_name):
+    """INSERT ... SELECT recomputing every rollup row from raw sales."""
+    day = rollup_day(Invoice.created_at, dialect_name)
+    product_id = func.coalesce(InvoiceItem.product_id, 0)
+    category_id = func.coalesce(InvoiceItem.category_id, 0)
+    user_id = func.coalesce(Invoice.created_by_id, 0)
+    source = (
+        select(
+            day,
+            product_id,
+            category_id,
+            user_id,
+            func.sum(InvoiceItem.quantity),
+            func.sum(InvoiceItem.subtotal_cents),
+            func.count(func.distinct(InvoiceItem.invoice_id)),
+        )
+        .select_from(InvoiceItem)
+        .join(Invoice, InvoiceItem.invoice_id == Invoice.id)
+        .group_by(day, product_id, category_id, user_id)
+    )
+    return insert(ROLLUP).from_select(
+        ["day", "product_id", "category_id", "user_id", "quantity", "revenue_cents", "invoice_count"],
+        source,
+    )
+
+
+def rebuild():
+    """Replace the whole rollup with a fresh aggregate of invoice items."""
+    db.session.execute(delete(ROLLUP))
+    db.session.execute(rebuild_statement(_dialect_name()))
+    db.session.commit()
+
+
+@rollup_cli.command("rebuild")
+def rebuild_command():
+    """Recompute daily_sales_rollup from invoices and invoice items."""
+    rebuild()
+    rows = db.session.query(func.count()).select_from(ROLLUP).scalar()
+    click.echo(f"Rebuilt daily_sales_rollup: {rows} rows")
@@ -1,10 +1,15 @@
+from datetime import datetime, timedelta
 from flask import request
 from flask_restx import Namespace, Resource, fields
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
 from ..models import User
 from ..extensions import db
+from ..idempotency import idempotent
+from ..passwords import HasherBusy, passwords
 from flask_jwt_extended import (
     create_access_token,
+    create_refresh_token,
     jwt_required,
     get_jwt_identity,
     get_jwt,
@@ -29,23 +34,58 @@ reset_model = auth_ns.model('ResetPassword', {
 })
 
 
+def busy():
+    return {'message': 'Too many password checks in progress, try again shortly'}, 503, {'Retry-After': '1'}
+
+
+def issue_tokens(identity):
+    return {
+        'access_token': create_access_token(identity=identity),
+        'refresh_token': create_refresh_token(identity=identity),
+    }
+
+
+def expiry(claims):
+    return datetime.utcfromtimestamp(claims["exp"]) if "exp" in claims else datetime.utcnow() + timedelta(days=365)
+
+
+def release_connection():
+    # A password hash takes ~0.1 s of CPU; without this the request would
+    # hold a pooled connection throughout, and a login storm would drain
+    # the pool for every other endpoint
+    db.session.close()
+
+
 @auth_ns.route('/register')
 class Register(Resource):
     @auth_ns.expect(register_model)
+    @idempotent
     def post(self):
         data = request.get_json()
-        
-        if User.query.filter((User.username == data['username']) | (User.email == data['email'])).first():
+
+        # One lookup on the unique username and email indexes, before paying for a hash
+        taken = (User.username == data['username']) | (User.email == data['email'])
+        if db.session.query(exists().where(taken)).scalar():
             return {'message': 'User already exists'}, 400
-        
+
+        release_connection()
+        try:
+            password_hash = passwords.hash(data['password'])
+        except HasherBusy:
+            return busy()
         user = User(
             username=data['username'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password'])
+            password_hash=password_hash
         )
-        
+
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Registered by a concurrent request since the check above
+            db.session.rollback()
+            return {'message': 'User already exists'}, 400
 
         return {'message': 'User created successfully'}, 201
 
@@ -55,13 +95,45 @@ class Login(Resource):
     @auth_ns.expect(login_model)
     def post(self):
         data = request.get_json()
+        password = data.get('password') or ''
         user = User.query.filter_by(username=data.get('username')).first()
-
-        if not user or not check_password_hash(user.password_hash, data.get('password')):
+        if not user:
             return {'message': 'Invalid username or password'}, 401
-
-        token = create_access_token(identity=str(user.id))
-        return {'access_token': token}, 200
+        user_id, stored = user.id, user.password_hash
+        release_connection()
+
+        try:
+            if not passwords.verify(stored, password):
+                return {'message': 'Invalid username or password'}, 401
+        except HasherBusy:
+            return busy()
+
+        if passwords.needs_rehash(stored):
+            # Upgrade to the current hash settings, unless the password was
+            # changed meanwhile. Best effort: when the hashers are busy the
+            # login still succeeds and a later one upgrades the hash.
+            try:
+                new_hash = passwords.hash(password)
+            except HasherBusy:
+                new_hash = None
+            if new_hash:
+                User.query.filter_by(id=user_id, password_hash=stored).update({'password_hash': new_hash})
+                db.session.commit()
+
+        return issue_tokens(str(user_id)), 200
+
+
+@auth_ns.route('/refresh')
+class Refresh(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        """Trade a refresh token for a new access and refresh token pair."""
+        claims = get_jwt()
+        # Each refresh token works once, so a stolen copy is either useless
+        # or makes the owner's next refresh fail
+        if not blacklist.revoke(claims["jti"], expiry(claims)):
+            return {'msg': 'Token has been revoked'}, 401
+        return issue_tokens(get_jwt_identity()), 200
 
 
 @auth_ns.route('/protected')
@@ -93,6 +165,7 @@ class GetAllUsers(Resource):
 class ResetPassword(Resource):
     @jwt_required()
     @auth_ns.expect(reset_model)
+    @idempotent
     def put(self, user_id):
         data = request.get_json()
         new_password = data['new_password']
@@ -101,7 +174,12 @@ class ResetPassword(Resource):
         if not user:
             return {'message': 'User not found'}, 404
 
-        user.password_hash = generate_password_hash(new_password)
+        release_connection()
+        try:
+            password_hash = passwords.hash(new_password)
+        except HasherBusy:
+            return busy()
+        User.query.filter_by(id=user_id).update({'password_hash': password_hash})
         db.session.commit()
 
         return {'message': 'Password updated successfully'}, 200
@@ -109,8 +187,16 @@ class ResetPassword(Resource):
 
 @auth_ns.route('/logout')
 class Logout(Resource):
-    @jwt_required()
+    @jwt_required(verify_type=False)
+    @idempotent
     def post(self):
-        jti = get_jwt()["jti"]
-        blacklist.add(jti)
+        """End the session of the refresh token sent.
+
+        Access tokens are not revocable and run out on their own within
+        JWT_ACCESS_TOKEN_EXPIRES, so sending one only gets a reminder.
+        """
+        claims = get_jwt()
+        if claims["type"] != "refresh":
+            return {'message': 'Send the refresh token to log out; access tokens expire on their own'}, 200
+        blacklist.revoke(claims["jti"], expiry(claims))
         return {'message': 'Successfully logged out'}, 200
@@ -1,8 +1,11 @@
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from ..models import Category
+from ..cache import catalog_cache
 from ..extensions import db
+from ..idempotency import idempotent
 from ..schemas import CategorySchema
+from ..versions import bump, changes_since, tombstone
 
 cat_ns = Namespace('categories', description='Category operations')
 cat_model = cat_ns.model('Category', {'name': fields.String(required=True), 'description': fields.String()})
@@ -10,36 +13,49 @@ cat_model = cat_ns.model('Category', {'name': fields.String(required=True), 'des
 @cat_ns.route('')
 class CategoryList(Resource):
     def get(self):
-        cats = Category.query.all()
-        return CategorySchema(many=True).dump(cats), 200
+        if "since" in request.args:
+            return catalog_cache.respond(
+                "categories", lambda: changes_since("categories", Category, CategorySchema().dump)
+            )
+        return catalog_cache.respond(
+            "categories", lambda: (CategorySchema(many=True).dump(Category.query.all()), 200)
+        )
 
     @cat_ns.expect(cat_model)
+    @idempotent
     def post(self):
         data = request.get_json()
         if Category.query.filter_by(name=data['name']).first():
             return {'message':'Category exists'}, 400
-        cat = Category(name=data['name'], description=data.get('description'))
+        cat = Category(name=data['name'], description=data.get('description'), version=bump("categories"))
         db.session.add(cat)
         db.session.commit()
+        catalog_cache.invalidate("categories")
         return CategorySchema().dump(cat), 201
 
 @cat_ns.route('/<int:id>')
 class CategoryItem(Resource):
     def get(self, id):
-        c = Category.query.get_or_404(id)
-        return CategorySchema().dump(c), 200
+        return catalog_cache.respond(
+            "categories", lambda: (CategorySchema().dump(Category.query.get_or_404(id)), 200), item_id=id
+        )
 
     @cat_ns.expect(cat_model)
+    @idempotent
     def put(self, id):
         c = Category.query.get_or_404(id)
         data = request.get_json()
         c.name = data.get('name', c.name)
         c.description = data.get('description', c.description)
+        c.version = bump("categories")
         db.session.commit()
+        catalog_cache.invalidate("categories", [id])
         return CategorySchema().dump(c), 200
 
     def delete(self, id):
         c = Category.query.get_or_404(id)
         db.session.delete(c)
+        tombstone("categories", id)
         db.session.commit()
+        catalog_cache.invalidate("categories", [id])
         return {'message':'Deleted'}, 200
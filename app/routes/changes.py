@@ -0,0 +1,112 @@
+import time
+
+from flask import Response, current_app, request, stream_with_context
+from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required
+from ..changes import TOPICS, FeedExpired, check_position, read_events, sse_message, wait_for_changes
+from ..extensions import db
+from ..pagination import page_args
+
+chg_ns = Namespace("changes", description="Invoice and product change feed", security="Bearer Auth")
+
+feed_parser = chg_ns.parser()
+feed_parser.add_argument("after", type=int, location="args", help="Resume after this seq (default 0); Last-Event-ID takes precedence")
+feed_parser.add_argument("topic", action="append", choices=TOPICS, location="args", help="Repeat to follow several topics (default all)")
+feed_parser.add_argument("limit", type=int, location="args", help="Max events per response/batch (default 50, max 500)")
+feed_parser.add_argument("wait", type=int, location="args", help="JSON only: long-poll up to this many seconds (max 30)")
+
+MAX_WAIT = 30
+HEARTBEAT_INTERVAL = 15
+
+
+def feed_args():
+    """Read ``(after, topics, limit)``; raises ValueError on bad input."""
+    limit, after = page_args()
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise ValueError("Last-Event-ID must be an integer seq")
+    after = after or 0
+    if after < 0:
+        raise ValueError("after must not be negative")
+
+    topics = request.args.getlist("topic") or list(TOPICS)
+    unknown = set(topics) - set(TOPICS)
+    if unknown:
+        raise ValueError(f"Unknown topic: {sorted(unknown)[0]}")
+    return after, topics, limit
+
+
+def event_stream(after, topics, limit):
+    poll = current_app.config["CHANGE_FEED_POLL_INTERVAL"]
+    deadline = time.monotonic() + current_app.config["CHANGE_FEED_STREAM_TIMEOUT"]
+    last_sent = time.monotonic()
+    yield "retry: 2000\n\n"
+    while True:
+        events, cursor = read_events(after, topics, limit)
+        # Hand the connection back to the pool while the client waits
+        db.session.close()
+        if events:
+            yield "".join(sse_message(e) for e in events)
+            last_sent = time.monotonic()
+        elif cursor != after:
+            # An id-only message moves the client's Last-Event-ID past
+            # events on other topics without dispatching anything
+            yield f"id: {cursor}\n\n"
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+        after = cursor
+
+        if len(events) == limit:
+            continue
+        # Bounded so a stream cannot pin a worker forever; EventSource
+        # reconnects on its own and resumes from Last-Event-ID
+        if time.monotonic() >= deadline:
+            return
+        wait_for_changes(poll)
+
+
+@chg_ns.route("")
+class ChangeFeed(Resource):
+
+    @jwt_required()
+    @chg_ns.expect(feed_parser)
+    def get(self):
+        """
+        Invoice and product create/update/delete events after a position.
+        With Accept: text/event-stream the response is a server-sent event
+        stream; otherwise JSON {"events": [...], "cursor": n}, waiting up to
+        ``wait`` seconds for the first event. Pass ``cursor`` (or the last
+        event's seq) back as ``after`` to resume. 410 means the position was
+        pruned; reload the full lists and start from the current cursor.
+        """
+        try:
+            after, topics, limit = feed_args()
+            wait = min(int(request.args.get("wait", 0)), MAX_WAIT)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        try:
+            check_position(after)
+        except FeedExpired:
+            return {"message": "Position no longer in the change log; reload and resume from the current cursor"}, 410
+
+        if request.accept_mimetypes.best_match(["application/json", "text/event-stream"]) == "text/event-stream":
+            return Response(
+                stream_with_context(event_stream(after, topics, limit)),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        deadline = time.monotonic() + wait
+        while True:
+            events, cursor = read_events(after, topics, limit)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return {"events": events, "cursor": cursor}, 200
+            db.session.close()
+            wait_for_changes(min(remaining, current_app.config["CHANGE_FEED_POLL_INTERVAL"]))
@@ -1,8 +1,22 @@
+from datetime import datetime, timezone
+
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from ..cache import catalog_cache
+from ..changes import record
+from ..dates import filter_created_at
+from ..exports import export_format, query_batches, stream_export
 from ..extensions import db
+from ..idempotency import idempotent
 from ..models import Invoice, InvoiceItem, Product
+from ..pagination import page_args, keyset_page, page_headers
+from ..rollup import apply_invoice, apply_invoices
+from ..versions import touch
+from ..stock import InsufficientStock, adjust_stock, diff_quantities, invoice_quantities, line_quantities, stock_levels
 
 inv_ns = Namespace("invoices", description="Sales Invoice Management", security="Bearer Auth")
 
@@ -16,38 +30,159 @@ invoice_model = inv_ns.model("InvoiceInput", {
     "customer_name": fields.String(required=True),
     "customer_phone": fields.String(),
     "customer_address": fields.String(),
+    "idempotency_key": fields.String(description="Client-chosen id of this sale; resubmitting it returns the stored invoice"),
     "items": fields.List(fields.Nested(item_model), required=True)
 })
 
+batch_invoice_model = inv_ns.inherit("BatchInvoiceInput", invoice_model, {
+    "created_at": fields.DateTime(description="When the sale happened (ISO 8601); defaults to now")
+})
+
+batch_model = inv_ns.model("InvoiceBatchInput", {
+    "invoices": fields.List(fields.Nested(batch_invoice_model), required=True)
+})
+
+MAX_BATCH_INVOICES = 500
+
+# Query string for the paginated listing
+list_parser = inv_ns.parser()
+list_parser.add_argument("limit", type=int, location="args", help="Page size (default 50, max 500)")
+list_parser.add_argument("after", type=int, location="args", help="Cursor from the X-Next-Cursor header of the previous page")
+list_parser.add_argument("start", type=str, location="args", help="YYYY-MM-DD, inclusive")
+list_parser.add_argument("end", type=str, location="args", help="YYYY-MM-DD, inclusive")
+
+export_parser = inv_ns.parser()
+export_parser.add_argument("format", type=str, choices=("csv", "ndjson"), location="args", help="Default csv")
+export_parser.add_argument("start", type=str, location="args", help="YYYY-MM-DD, inclusive")
+export_parser.add_argument("end", type=str, location="args", help="YYYY-MM-DD, inclusive")
+
+INVOICE_EXPORT_FIELDS = ["id", "created_at", "customer_name", "customer_phone", "customer_address", "total"]
+ITEM_EXPORT_FIELDS = ["invoice_id", "created_at", "product_id", "product_name", "quantity", "unit_price", "subtotal"]
+
+
+def invoice_to_dict(inv):
+    return {
+        "id": inv.id,
+        "customer_name": inv.customer_name,
+        "customer_phone": inv.customer_phone,
+        "customer_address": inv.customer_address,
+        "items": [
+            {
+                "product_id": i.product_id,
+                "product_name": i.product.name if i.product else None,
+                "quantity": i.quantity,
+                "unit_price": i.unit_price_cents / 100.0,
+                "subtotal": i.subtotal_cents / 100.0
+            } for i in inv.items
+        ],
+        "total": inv.total_cents / 100.0
+    }
+
+
+def parse_lines(items):
+    """Validate raw invoice lines into ``(product_id, quantity)`` pairs.
+
+    Raises ValueError naming the offending line.
+    """
+    lines = []
+    for it in items:
+        product_id = it.get("product_id")
+        quantity = it.get("quantity")
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid product_id: {product_id}")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise ValueError(f"Invalid quantity for product_id: {product_id}")
+        lines.append((product_id, quantity))
+    return lines
+
+
+def load_prices(product_ids):
+    """Current (price_cents, category_id) of each existing product in ``product_ids``, in one query."""
+    if not product_ids:
+        return {}
+    return {
+        product_id: (price_cents, category_id)
+        for product_id, price_cents, category_id in db.session.query(Product.id, Product.price_cents, Product.category_id)
+        .filter(Product.id.in_(product_ids))
+    }
+
+
+def price_lines(lines, prices):
+    """Price parsed lines; raises ValueError for an unknown product."""
+    rows = []
+    total_cents = 0
+    for product_id, quantity in lines:
+        if product_id not in prices:
+            raise ValueError(f"Invalid product_id: {product_id}")
+        unit_price_cents, category_id = prices[product_id]
+        subtotal_cents = unit_price_cents * quantity
+        total_cents += subtotal_cents
+        rows.append({
+            "product_id": product_id,
+            "quantity": quantity,
+            "unit_price_cents": unit_price_cents,
+            "subtotal_cents": subtotal_cents,
+            "category_id": category_id,
+        })
+    return rows, total_cents
+
+
+def price_items(items):
+    """Resolve and price invoice lines with a single product lookup.
+
+    Returns ``(rows, total_cents)`` where each row holds the InvoiceItem
+    columns except ``invoice_id``. Raises ValueError naming the offending
+    line on bad input.
+    """
+    lines = parse_lines(items)
+    return price_lines(lines, load_prices({product_id for product_id, _ in lines}))
+
+
+def parse_created_at(value):
+    """Optional ISO 8601 sale time sent by an offline till, as naive UTC."""
+    if value is None:
+        return None
+    try:
+        created_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("created_at must be an ISO 8601 datetime")
+    if created_at.tzinfo:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at
+
+
+def insert_items(invoice_id, rows):
+    """Insert priced lines for an invoice as one executemany statement."""
+    if rows:
+        db.session.execute(insert(InvoiceItem), [dict(r, invoice_id=invoice_id) for r in rows])
+
+
 @inv_ns.route("")
 class InvoiceList(Resource):
 
     @jwt_required()
+    @inv_ns.expect(list_parser)
     def get(self):
-        """List all invoices"""
-        invoices = Invoice.query.all()
-        result = []
-        for inv in invoices:
-            result.append({
-                "id": inv.id,
-                "customer_name": inv.customer_name,
-                "customer_phone": inv.customer_phone,
-                "customer_address": inv.customer_address,
-                "items": [
-                    {
-                        "product_id": i.product_id,
-                        "product_name": i.product.name if i.product else None,
-                        "quantity": i.quantity,
-                        "unit_price": i.unit_price_cents / 100.0,
-                        "subtotal": i.subtotal_cents / 100.0
-                    } for i in inv.items
-                ],
-                "total": inv.total_cents / 100.0
-            })
-        return result, 200
+        """List invoices one keyset page at a time, optionally within a date range"""
+        try:
+            limit, after = page_args()
+            q = filter_created_at(Invoice.query, request.args, Invoice.created_at)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        # Items and their products are fetched with one IN query each for the
+        # whole page, so a page costs three statements however many rows it has.
+        q = q.options(
+            selectinload(Invoice.items).selectinload(InvoiceItem.product).load_only(Product.name)
+        )
+        invoices, next_cursor = keyset_page(q, Invoice.id, after, limit)
+        return [invoice_to_dict(inv) for inv in invoices], 200, page_headers(next_cursor)
 
     @jwt_required()
     @inv_ns.expect(invoice_model)
+    @idempotent
     def post(self):
         """Create a new sale/invoice"""
         data = request.json
@@ -55,44 +190,231 @@ class InvoiceList(Resource):
         customer_phone = data.get("customer_phone")
         customer_address = data.get("customer_address")
         items = data.get("items", [])
+        idempotency_key = data.get("idempotency_key")
 
         if not items:
             return {"message": "At least one item is required"}, 400
 
+        if idempotency_key:
+            existing_id = db.session.query(Invoice.id).filter_by(idempotency_key=idempotency_key).scalar()
+            if existing_id:
+                return {"message": "Invoice already exists", "id": existing_id}, 200
+
+        try:
+            rows, total_cents = price_items(items)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        try:
+            stock_changed = adjust_stock(line_quantities(rows))
+        except InsufficientStock as e:
+            return {"message": str(e)}, 409
+
         new_invoice = Invoice(
             customer_name=customer_name,
             customer_phone=customer_phone,
-            customer_address=customer_address
+            customer_address=customer_address,
+            total_cents=total_cents,
+            idempotency_key=idempotency_key
         )
         db.session.add(new_invoice)
-        db.session.flush()  # get invoice ID
+        try:
+            db.session.flush()  # get invoice ID
+        except IntegrityError:
+            db.session.rollback()
+            return {"message": "idempotency_key is being used by a concurrent request; retry"}, 409
+
+        invoice_id = new_invoice.id
+        insert_items(invoice_id, rows)
+        apply_invoice(new_invoice, 1)
+        touch("products", Product, stock_changed)
+        record("invoices", "create", [invoice_id])
+        record("products", "update", stock_changed)
+        db.session.commit()
+        catalog_cache.invalidate("products", stock_changed)
+        return {"message": "Invoice created", "id": invoice_id}, 201
 
-        total_cents = 0
 
-        for it in items:
-            product_id = it.get("product_id")
-            quantity = it.get("quantity")
-            product = Product.query.get(product_id)
-            if not product:
+@inv_ns.route("/batch")
+class InvoiceBatch(Resource):
+
+    @jwt_required()
+    @inv_ns.expect(batch_model)
+    @idempotent
+    def post(self):
+        """
+        Create many invoices in one request, e.g. sales queued by an offline till.
+        Every accepted invoice is written in one transaction; the others are
+        reported without affecting the rest. Each result is one of
+        created (with id), duplicate (idempotency_key already stored, with
+        the stored id) or error (with message), in request order.
+        """
+        entries = (request.json or {}).get("invoices")
+        if not isinstance(entries, list) or not entries:
+            return {"message": "invoices must be a non-empty list"}, 400
+        if len(entries) > MAX_BATCH_INVOICES:
+            return {"message": f"At most {MAX_BATCH_INVOICES} invoices per batch"}, 400
+        if not all(isinstance(entry, dict) for entry in entries):
+            return {"message": "Each invoice must be an object"}, 400
+
+        results = [None] * len(entries)
+        keys = {entry["idempotency_key"] for entry in entries if entry.get("idempotency_key")}
+        stored = dict(
+            db.session.query(Invoice.idempotency_key, Invoice.id).filter(Invoice.idempotency_key.in_(keys)).all()
+        ) if keys else {}
+
+        # Validate everything before touching stock
+        parsed, seen = [], set()
+        for index, entry in enumerate(entries):
+            key = entry.get("idempotency_key")
+            if key in stored:
+                results[index] = {"status": "duplicate", "id": stored[key]}
+                continue
+            try:
+                if key and key in seen:
+                    raise ValueError("idempotency_key repeated in this batch")
+                if not entry.get("items"):
+                    raise ValueError("At least one item is required")
+                parsed.append((index, entry, parse_lines(entry["items"]), parse_created_at(entry.get("created_at"))))
+            except ValueError as e:
+                results[index] = {"status": "error", "message": str(e)}
+                continue
+            if key:
+                seen.add(key)
+
+        # One price lookup for the whole batch
+        prices = load_prices({product_id for _, _, lines, _ in parsed for product_id, _ in lines})
+        priced = []
+        for index, entry, lines, created_at in parsed:
+            try:
+                rows, total_cents = price_lines(lines, prices)
+            except ValueError as e:
+                results[index] = {"status": "error", "message": str(e)}
+                continue
+            priced.append((index, entry, rows, total_cents, created_at))
+
+        # Check stock per invoice in request order, then take it for the
+        # whole batch in one adjust_stock() call, so its rows are locked in
+        # a single id-ordered pass and overlapping batches cannot deadlock
+        levels = stock_levels({pid for _, _, rows, _, _ in priced for pid in line_quantities(rows)})
+        accepted, taken = [], {}
+        for index, entry, rows, total_cents, created_at in priced:
+            needed = line_quantities(rows)
+            short = [pid for pid, n in needed.items() if levels.get(pid, 0) - taken.get(pid, 0) < n]
+            if short:
+                results[index] = {"status": "error", "message": str(InsufficientStock(min(short)))}
+                continue
+            for pid, n in needed.items():
+                taken[pid] = taken.get(pid, 0) + n
+            accepted.append((index, entry, rows, total_cents, created_at))
+
+        if accepted:
+            try:
+                stock_changed = adjust_stock(taken)
+            except InsufficientStock as e:
+                # Stock sold since stock_levels() read it; only possible on
+                # SQLite, where those rows are not locked
+                return {"message": str(e)}, 409
+            now = datetime.utcnow()
+            invoice_ids = db.session.execute(
+                insert(Invoice).returning(Invoice.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "customer_name": entry.get("customer_name"),
+                        "customer_phone": entry.get("customer_phone"),
+                        "customer_address": entry.get("customer_address"),
+                        "total_cents": total_cents,
+                        "idempotency_key": entry.get("idempotency_key"),
+                        "created_at": created_at or now,
+                    }
+                    for _, entry, _, total_cents, created_at in accepted
+                ],
+            ).scalars().all()
+            db.session.execute(insert(InvoiceItem), [
+                dict(row, invoice_id=invoice_id)
+                for invoice_id, (_, _, rows, _, _) in zip(invoice_ids, accepted)
+                for row in rows
+            ])
+            apply_invoices(invoice_ids, 1)
+            touch("products", Product, stock_changed)
+            record("invoices", "create", invoice_ids)
+            record("products", "update", stock_changed)
+            try:
+                db.session.commit()
+            except IntegrityError:
                 db.session.rollback()
-                return {"message": f"Invalid product_id: {product_id}"}, 400
-
-            unit_price_cents = product.price_cents
-            subtotal_cents = unit_price_cents * quantity
-            total_cents += subtotal_cents
-
-            invoice_item = InvoiceItem(
-                invoice_id=new_invoice.id,
-                product_id=product.id,
-                quantity=quantity,
-                unit_price_cents=unit_price_cents,
-                subtotal_cents=subtotal_cents
+                return {"message": "An idempotency_key is being used by a concurrent request; retry"}, 409
+            catalog_cache.invalidate("products", stock_changed)
+            for invoice_id, (index, _, _, _, _) in zip(invoice_ids, accepted):
+                results[index] = {"status": "created", "id": invoice_id}
+
+        return {"results": [dict(result, index=index) for index, result in enumerate(results)]}, 200
+
+
+def invoice_export_row(r):
+    return {
+        "id": r.id,
+        "created_at": r.created_at.isoformat() if r.created_at else None,
+        "customer_name": r.customer_name,
+        "customer_phone": r.customer_phone,
+        "customer_address": r.customer_address,
+        "total": r.total_cents / 100.0
+    }
+
+
+def item_export_row(r):
+    return {
+        "invoice_id": r.invoice_id,
+        "created_at": r.created_at.isoformat() if r.created_at else None,
+        "product_id": r.product_id,
+        "product_name": r.product_name,
+        "quantity": r.quantity,
+        "unit_price": r.unit_price_cents / 100.0,
+        "subtotal": r.subtotal_cents / 100.0
+    }
+
+
+@inv_ns.route("/export")
+class InvoiceExport(Resource):
+
+    @jwt_required()
+    @inv_ns.expect(export_parser)
+    def get(self):
+        """Download invoices as CSV or NDJSON, streamed in id order"""
+        try:
+            fmt = export_format()
+            stmt = filter_created_at(
+                select(Invoice.id, Invoice.created_at, Invoice.customer_name, Invoice.customer_phone,
+                       Invoice.customer_address, Invoice.total_cents),
+                request.args, Invoice.created_at
             )
-            db.session.add(invoice_item)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        return stream_export("invoices", fmt, INVOICE_EXPORT_FIELDS,
+                             query_batches(stmt.order_by(Invoice.id)), invoice_export_row)
 
-        new_invoice.total_cents = total_cents
-        db.session.commit()
-        return {"message": "Invoice created", "id": new_invoice.id}, 201
+
+@inv_ns.route("/items/export")
+class InvoiceItemExport(Resource):
+
+    @jwt_required()
+    @inv_ns.expect(export_parser)
+    def get(self):
+        """Download invoice lines as CSV or NDJSON, one row per line"""
+        try:
+            fmt = export_format()
+            stmt = filter_created_at(
+                select(InvoiceItem.invoice_id, Invoice.created_at, InvoiceItem.product_id,
+                       Product.name.label("product_name"), InvoiceItem.quantity,
+                       InvoiceItem.unit_price_cents, InvoiceItem.subtotal_cents)
+                .join(Invoice, InvoiceItem.invoice_id == Invoice.id)
+                .outerjoin(Product, InvoiceItem.product_id == Product.id),
+                request.args, Invoice.created_at
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        return stream_export("invoice_items", fmt, ITEM_EXPORT_FIELDS,
+                             query_batches(stmt.order_by(InvoiceItem.invoice_id, InvoiceItem.id)), item_export_row)
 
 
 @inv_ns.route("/<int:id>")
@@ -101,73 +423,61 @@ class InvoiceDetail(Resource):
     @jwt_required()
     def get(self, id):
         """Get single invoice by ID"""
-        inv = Invoice.query.get_or_404(id)
-        return {
-            "id": inv.id,
-            "customer_name": inv.customer_name,
-            "customer_phone": inv.customer_phone,
-            "customer_address": inv.customer_address,
-            "items": [
-                {
-                    "product_id": i.product_id,
-                    "product_name": i.product.name if i.product else None,
-                    "quantity": i.quantity,
-                    "unit_price": i.unit_price_cents / 100.0,
-                    "subtotal": i.subtotal_cents / 100.0
-                } for i in inv.items
-            ],
-            "total": inv.total_cents / 100.0
-        }, 200
+        inv = Invoice.query.options(
+            selectinload(Invoice.items).selectinload(InvoiceItem.product).load_only(Product.name)
+        ).filter_by(id=id).first_or_404()
+        return invoice_to_dict(inv), 200
 
     @jwt_required()
     @inv_ns.expect(invoice_model)
+    @idempotent
     def put(self, id):
         """Update existing sale/invoice"""
-        inv = Invoice.query.get_or_404(id)
+        # Lock the invoice so a concurrent update or delete cannot change
+        # its lines between reading them here and writing the new ones
+        inv = Invoice.query.filter_by(id=id).with_for_update().first_or_404()
         data = request.json
+        try:
+            rows, total_cents = price_items(data.get("items", []))
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        try:
+            stock_changed = adjust_stock(diff_quantities(line_quantities(rows), invoice_quantities(id)))
+        except InsufficientStock as e:
+            return {"message": str(e)}, 409
+
         inv.customer_name = data.get("customer_name", inv.customer_name)
         inv.customer_phone = data.get("customer_phone", inv.customer_phone)
         inv.customer_address = data.get("customer_address", inv.customer_address)
+        inv.total_cents = total_cents
 
-        # Clear existing items
+        # Replace existing items
+        apply_invoice(inv, -1)
         InvoiceItem.query.filter_by(invoice_id=id).delete()
-
-        items = data.get("items", [])
-        total_cents = 0
-
-        for it in items:
-            product_id = it.get("product_id")
-            quantity = it.get("quantity")
-            product = Product.query.get(product_id)
-            if not product:
-                db.session.rollback()
-                return {"message": f"Invalid product_id: {product_id}"}, 400
-
-            unit_price_cents = product.price_cents
-            subtotal_cents = unit_price_cents * quantity
-            total_cents += subtotal_cents
-
-            invoice_item = InvoiceItem(
-                invoice_id=inv.id,
-                product_id=product.id,
-                quantity=quantity,
-                unit_price_cents=unit_price_cents,
-                subtotal_cents=subtotal_cents
-            )
-            db.session.add(invoice_item)
-
-        inv.total_cents = total_cents
+        insert_items(id, rows)
+        apply_invoice(inv, 1)
+        touch("products", Product, stock_changed)
+        record("invoices", "update", [id])
+        record("products", "update", stock_changed)
         db.session.commit()
-        return {"message": "Invoice updated", "id": inv.id}, 200
+        catalog_cache.invalidate("products", stock_changed)
+        return {"message": "Invoice updated", "id": id}, 200
 
     @jwt_required()
     def delete(self, id):
         """Delete a sale/invoice"""
-        inv = Invoice.query.get_or_404(id)
+        inv = Invoice.query.filter_by(id=id).with_for_update().first_or_404()
         try:
+            stock_changed = adjust_stock(diff_quantities({}, invoice_quantities(id)))
+            apply_invoice(inv, -1)
             InvoiceItem.query.filter_by(invoice_id=id).delete()
             db.session.delete(inv)
+            touch("products", Product, stock_changed)
+            record("invoices", "delete", [id])
+            record("products", "update", stock_changed)
             db.session.commit()
+            catalog_cache.invalidate("products", stock_changed)
             return {"message": "Invoice deleted"}, 200
         except Exception as e:
             db.session.rollback()
@@ -1,10 +1,19 @@
-import os
-from flask import request, current_app, url_for
+import sys
+
+from flask import request, current_app
 from flask_restx import Namespace, Resource, fields
-from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required
+from ..cache import catalog_cache
+from ..changes import record
 from ..extensions import db
+from ..idempotency import idempotent
+from ..images import image_urls, release_image
+from ..imports import import_products
+from ..jobs import image_jobs
 from ..models import Product, Category
+from ..pagination import page_args, keyset_page, page_headers, offset_args, offset_headers
+from ..search import match_products, search_page, search_terms
+from ..versions import bump, changes_since, tombstone
 
 prod_ns = Namespace("products", description="Product operations", security="Bearer Auth")
 
@@ -26,34 +35,123 @@ upload_parser.add_argument("quantity", type=int, required=True, location="form")
 upload_parser.add_argument("category_id", type=int, required=True, location="form")
 upload_parser.add_argument("image", type="file", location="files")
 
+# Query string for the paginated listing
+list_parser = prod_ns.parser()
+list_parser.add_argument("limit", type=int, location="args", help="Page size (default 50, max 500)")
+list_parser.add_argument("after", type=int, location="args", help="Cursor from the X-Next-Cursor header of the previous page")
+list_parser.add_argument("category_id", type=int, location="args")
+list_parser.add_argument("min_price", type=float, location="args")
+list_parser.add_argument("max_price", type=float, location="args")
+list_parser.add_argument("in_stock", type=str, location="args", help="true to only list products with quantity > 0")
+list_parser.add_argument("name", type=str, location="args", help="Name prefix (case-sensitive)")
+
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in current_app.config["ALLOWED_IMAGE_EXTENSIONS"]
 
 
+def product_to_dict(p):
+    urls = image_urls(p.image_filename)
+    return {
+        "id": p.id,
+        "name": p.name,
+        "sku": p.sku,
+        "description": p.description,
+        "price": p.price_cents / 100.0,
+        "quantity": p.quantity,
+        "category_id": p.category_id,
+        "image_url": urls["large"] if urls else None,
+        "image_urls": urls,
+        "image_status": p.image_status
+    }
+
+
+def _price_cents(args, name):
+    try:
+        return int(round(float(args[name]) * 100))
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def filter_products(q, args):
+    """Apply the listing filters from the query string to a Product query.
+
+    Every filter is a plain range or equality predicate on an indexed column
+    so the database can seek instead of scanning the catalog. The name filter
+    is a case-sensitive prefix match for the same reason.
+    """
+    if args.get("category_id"):
+        try:
+            q = q.filter(Product.category_id == int(args["category_id"]))
+        except ValueError:
+            raise ValueError("category_id must be an integer")
+    if args.get("min_price"):
+        q = q.filter(Product.price_cents >= _price_cents(args, "min_price"))
+    if args.get("max_price"):
+        q = q.filter(Product.price_cents <= _price_cents(args, "max_price"))
+    if args.get("in_stock", "").lower() in ("1", "true", "yes"):
+        q = q.filter(Product.quantity > 0)
+    prefix = args.get("name")
+    if prefix:
+        q = filter_name_prefix(q, prefix)
+    return q
+
+
+def filter_name_prefix(q, prefix):
+    """Restrict ``q`` to products whose name starts with ``prefix``."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # A range would follow the column's collation, which need not be
+        # code point order; a left-anchored LIKE is served by the
+        # text_pattern_ops index ix_product_name_pattern instead
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return q.filter(Product.name.like(escaped + "%", escape="\\"))
+    # name >= 'abc' AND name < 'abd' instead of LIKE 'abc%', which SQLite
+    # cannot serve from an index; its BINARY collation is code point order
+    q = q.filter(Product.name >= prefix)
+    upper = prefix_upper_bound(prefix)
+    return q.filter(Product.name < upper) if upper is not None else q
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string above every string starting with ``prefix``.
+
+    None when there is none, i.e. ``prefix`` is all U+10FFFF.
+    """
+    head = prefix.rstrip(chr(sys.maxunicode))
+    if not head:
+        return None
+    code = ord(head[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # Surrogates cannot be stored; the next character is U+E000
+        code = 0xE000
+    return head[:-1] + chr(code)
+
+
+def list_products():
+    try:
+        limit, after = page_args()
+        q = filter_products(Product.query, request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    products, next_cursor = keyset_page(q, Product.id, after, limit)
+    return [product_to_dict(p) for p in products], 200, page_headers(next_cursor)
+
+
 @prod_ns.route("")
 class ProductList(Resource):
 
     @jwt_required()
+    @prod_ns.expect(list_parser)
     def get(self):
-        products = Product.query.all()
-        result = []
-
-        for p in products:
-            result.append({
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "price": p.price_cents / 100.0,
-                "quantity": p.quantity,
-                "category_id": p.category_id,
-                "image_url": url_for("uploaded_file", filename=p.image_filename, _external=True) if p.image_filename else None
-            })
-
-        return result, 200
+        """List products one keyset page at a time, with optional filters"""
+        if "since" in request.args:
+            return catalog_cache.respond("products", lambda: changes_since("products", Product, product_to_dict))
+        return catalog_cache.respond("products", list_products)
 
     @jwt_required()
     @prod_ns.expect(upload_parser)
+    @idempotent
     def post(self):
         data = request.form
         try:
@@ -67,54 +165,125 @@ class ProductList(Resource):
                 return {"message": "Invalid category_id"}, 400
 
             image_file = request.files.get("image")
-            image_filename = None
-
             if image_file:
                 if image_file.filename == "":
                     return {"message": "No selected image"}, 400
                 if not allowed_file(image_file.filename):
                     return {"message": "Invalid image type"}, 400
 
-                image_filename = secure_filename(image_file.filename)
-                save_path = os.path.join(current_app.config["UPLOAD_FOLDER"], image_filename)
-                image_file.save(save_path)
-
             new_product = Product(
                 name=name,
                 description=description,
                 price_cents=int(price * 100),
                 quantity=quantity,
                 category_id=category_id,
-                image_filename=image_filename
+                version=bump("products")
             )
 
             db.session.add(new_product)
+            db.session.flush()  # get product ID
+            product_id = new_product.id
+
+            # The image is resized in the background; clients poll image_status
+            job_id = image_jobs.stage(new_product, image_file) if image_file else None
+            record("products", "create", [product_id])
             db.session.commit()
-            return {"message": "Product created", "id": new_product.id}, 201
+            catalog_cache.invalidate("products")
+            if job_id is None:
+                return {"message": "Product created", "id": product_id}, 201
+
+            if image_jobs.submit(job_id):
+                # Processed inline; the reload shows how it went
+                return {"message": "Product created", "id": product_id, "image_status": new_product.image_status}, 201
+            return {"message": "Product created", "id": product_id, "image_status": "pending"}, 202
 
         except Exception as e:
             db.session.rollback()
             return {"message": f"Internal Server Error: {str(e)}"}, 500
 
 
+search_parser = prod_ns.parser()
+search_parser.add_argument("q", type=str, required=True, location="args", help="Words to find in name or description; the last may be partial")
+search_parser.add_argument("limit", type=int, location="args", help="Page size (default 50, max 500)")
+search_parser.add_argument("offset", type=int, location="args", help="From the X-Next-Offset header of the previous page")
+search_parser.add_argument("category_id", type=int, location="args")
+search_parser.add_argument("in_stock", type=str, location="args", help="true to only list products with quantity > 0")
+
+
+def search_products():
+    terms = search_terms(request.args.get("q", ""))
+    if not terms:
+        return {"message": "q must contain at least one word"}, 400
+    try:
+        limit, offset = offset_args()
+        q = filter_products(Product.query, request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    ranked, older = match_products(q, terms, db.session.get_bind().dialect.name)
+    products, next_offset = search_page(ranked, older, limit, offset)
+    return [product_to_dict(p) for p in products], 200, offset_headers(next_offset)
+
+
+@prod_ns.route("/search")
+class ProductSearch(Resource):
+
+    @jwt_required()
+    @prod_ns.expect(search_parser)
+    def get(self):
+        """
+        Full-text product search on name and description, best matches first.
+        Meant for type-ahead: the word being typed (the last one, unless q
+        ends in a space) matches as a prefix. The 500 newest matching
+        products are ranked; older matches follow, newest first.
+        """
+        return catalog_cache.respond("products", search_products)
+
+
+import_parser = prod_ns.parser()
+import_parser.add_argument("format", type=str, choices=("csv", "ndjson"), location="args",
+                           help="Defaults to ndjson for an application/x-ndjson body, else csv")
+
+IMPORT_FORMATS = {"text/csv": "csv", "application/x-ndjson": "ndjson"}
+
+
+@prod_ns.route("/import")
+class ProductImport(Resource):
+
+    @jwt_required()
+    @prod_ns.expect(import_parser)
+    def post(self):
+        """
+        Create or update products in bulk from a CSV or NDJSON body.
+        Columns: sku, name, description, price, quantity, category_id.
+        Rows are matched on sku; invalid rows are skipped and listed in
+        ``errors`` by line number.
+        """
+        fmt = request.args.get("format") or IMPORT_FORMATS.get(request.mimetype, "csv")
+        if fmt not in ("csv", "ndjson"):
+            return {"message": "format must be one of: csv, ndjson"}, 400
+
+        # Supplier files are far bigger than the image upload limit
+        request.max_content_length = current_app.config["PRODUCT_IMPORT_MAX_BYTES"]
+        try:
+            report = import_products(request.stream, fmt)
+        finally:
+            catalog_cache.invalidate("products")
+        return report, 200
+
+
 @prod_ns.route("/<int:id>")
 class ProductItem(Resource):
 
     @jwt_required()
     def get(self, id):
-        p = Product.query.get_or_404(id)
-        return {
-            "id": p.id,
-            "name": p.name,
-            "description": p.description,
-            "price": p.price_cents / 100.0,
-            "quantity": p.quantity,
-            "category_id": p.category_id,
-            "image_url": url_for("uploaded_file", filename=p.image_filename, _external=True) if p.image_filename else None
-        }, 200
+        return catalog_cache.respond(
+            "products", lambda: (product_to_dict(Product.query.get_or_404(id)), 200), item_id=id
+        )
 
     @jwt_required()
     @prod_ns.expect(upload_parser)
+    @idempotent
     def put(self, id):
         p = Product.query.get_or_404(id)
         data = request.form
@@ -135,16 +304,20 @@ class ProductItem(Resource):
                 p.category_id = category_id
 
             image_file = request.files.get("image")
-            if image_file:
-                if not allowed_file(image_file.filename):
-                    return {"message": "Invalid image type"}, 400
-                filename = secure_filename(image_file.filename)
-                save_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-                image_file.save(save_path)
-                p.image_filename = filename
+            if image_file and not allowed_file(image_file.filename):
+                return {"message": "Invalid image type"}, 400
 
+            job_id = image_jobs.stage(p, image_file) if image_file else None
+            p.version = bump("products")
+            record("products", "update", [id])
             db.session.commit()
-            return {"message": "Product updated"}, 200
+            catalog_cache.invalidate("products", [id])
+            if job_id is None:
+                return {"message": "Product updated"}, 200
+
+            if image_jobs.submit(job_id):
+                return {"message": "Product updated", "image_status": p.image_status}, 200
+            return {"message": "Product updated", "image_status": "pending"}, 202
 
         except Exception as e:
             db.session.rollback()
@@ -154,13 +327,13 @@ class ProductItem(Resource):
     def delete(self, id):
         p = Product.query.get_or_404(id)
         try:
-            if p.image_filename:
-                file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], p.image_filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-
+            image_filename = p.image_filename
             db.session.delete(p)
+            tombstone("products", id)
+            record("products", "delete", [id])
             db.session.commit()
+            catalog_cache.invalidate("products", [id])
+            release_image(image_filename)
             return {"message": "Product deleted"}, 200
 
         except Exception as e:
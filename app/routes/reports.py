@@ -1,13 +1,37 @@
-from flask import request
+from flask import current_app, request
 from flask_restx import Namespace, Resource
-from ..models import Invoice, InvoiceItem, Product, User
+from ..models import Category, DailySalesRollup, Product, User
 from ..extensions import db
+from ..exports import export_format, query_batches, stream_export
+from ..dates import PERIODS, date_range, fill_periods, filter_days, period_bucket
+from ..pagination import offset_args, offset_page, offset_headers
 from sqlalchemy import func
-import datetime
 
 rep_ns = Namespace('reports', description='Reporting')
 
 
+def sales_report(args):
+    """Totals per period for the sales report; raises ValueError on bad input."""
+    range_type = args.get('range', 'daily')
+    if range_type not in PERIODS:
+        raise ValueError('range must be one of: daily, weekly, monthly')
+    start_dt, end_dt = date_range(args)
+    max_periods = current_app.config['REPORT_MAX_PERIODS']
+
+    grp = period_bucket(DailySalesRollup.day, range_type, db.session.get_bind().dialect.name)
+    q = db.session.query(grp.label('period'), func.sum(DailySalesRollup.revenue_cents).label('total'))
+    if start_dt:
+        q = q.filter(DailySalesRollup.day >= start_dt.date())
+    if end_dt:
+        q = q.filter(DailySalesRollup.day < end_dt.date())
+    totals = dict(q.group_by(grp).all())
+
+    return [
+        {'period': period, 'total': total / 100.0 if total else 0}
+        for period, total in fill_periods(totals, range_type, start_dt, end_dt, max_periods)
+    ]
+
+
 @rep_ns.route('/sales')
 class SalesReport(Resource):
     def get(self):
@@ -17,94 +41,114 @@ class SalesReport(Resource):
         start: YYYY-MM-DD
         end: YYYY-MM-DD
         range: daily | weekly | monthly
+        Weekly periods are labelled with the date of their Monday. Periods
+        without sales are included with a total of 0.
         """
-        start = request.args.get('start')
-        end = request.args.get('end')
-        range_type = request.args.get('range', 'daily')
-
-        q = db.session.query(Invoice)
-
-        if start:
-            start_dt = datetime.datetime.fromisoformat(start)
-            q = q.filter(Invoice.created_at >= start_dt)
-        if end:
-            end_dt = datetime.datetime.fromisoformat(end) + datetime.timedelta(days=1)
-            q = q.filter(Invoice.created_at < end_dt)
+        try:
+            return sales_report(request.args), 200
+        except ValueError as e:
+            return {'message': str(e)}, 400
 
-        if range_type == 'daily':
-            grp = func.strftime('%Y-%m-%d', Invoice.created_at)
-        elif range_type == 'monthly':
-            grp = func.strftime('%Y-%m', Invoice.created_at)
-        else:  # weekly
-            grp = func.strftime('%Y-%W', Invoice.created_at)
 
-        rows = db.session.query(
-            grp.label('period'),
-            func.sum(Invoice.total_cents).label('total')
-        ).filter(
-            Invoice.id.in_(q.with_entities(Invoice.id))
-        ).group_by('period').order_by('period').all()
-
-        return [{'period': r[0], 'total': r[1] / 100.0 if r[1] else 0} for r in rows], 200
+@rep_ns.route('/sales/export')
+class SalesReportExport(Resource):
+    def get(self):
+        """
+        Download the sales report as CSV or NDJSON
+        Query params: as /reports/sales, plus format: csv | ndjson
+        """
+        try:
+            fmt = export_format()
+            rows = sales_report(request.args)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        return stream_export('sales', fmt, ['period', 'total'], [rows], dict)
+
+
+SALES_BY_GROUPS = {
+    'product': lambda r: {'product_id': r.key, 'product': r.name, 'quantity': int(r.quantity), 'total': r.total / 100.0},
+    'category': lambda r: {'category_id': r.key or None, 'category': r.name or 'Uncategorized', 'quantity': int(r.quantity), 'total': r.total / 100.0},
+    'user': lambda r: {'user_id': r.key or None, 'user': r.name or 'Unknown', 'quantity': int(r.quantity), 'total': r.total / 100.0},
+}
+
+
+def sales_by_query(by):
+    """Build the GROUP BY query for one /sales-by grouping.
+
+    Reads the daily rollup, so the cost follows the number of days and
+    groups in range rather than the number of sales. Rows carry ``key``,
+    ``name``, ``quantity`` and ``total`` (cents) and are ordered by total,
+    largest first, so limit=N is a top-N report.
+    """
+    R = DailySalesRollup
+    total = func.sum(R.revenue_cents).label('total')
+    quantity = func.sum(R.quantity).label('quantity')
+
+    q = db.session.query().select_from(R)
+    if by == 'product':
+        key, name = R.product_id, Product.name
+        q = q.join(Product, R.product_id == Product.id)
+    elif by == 'category':
+        key, name = R.category_id, Category.name
+        q = q.outerjoin(Category, R.category_id == Category.id)
+    else:
+        key, name = R.user_id, User.username
+        q = q.outerjoin(User, R.user_id == User.id)
+
+    return q.with_entities(
+        key.label('key'), name.label('name'), quantity, total
+    ).group_by(key, name).having(func.sum(R.invoice_count) > 0).order_by(total.desc(), key)
 
 
 @rep_ns.route('/sales-by')
 class SalesBy(Resource):
     def get(self):
         """
-        Generate detailed sales report by product, category, or user
+        Generate sales totals grouped by product, category, or user
         Query params:
         by: product | category | user
         start: YYYY-MM-DD
         end: YYYY-MM-DD
+        limit: groups per page, largest totals first (default 50, max 500)
+        offset: groups to skip
+        """
+        by = request.args.get('by', 'product')
+        if by not in SALES_BY_GROUPS:
+            return {'message': 'by must be one of: product, category, user'}, 400
+
+        try:
+            limit, offset = offset_args()
+            q = sales_by_query(by)
+            q = filter_days(q, request.args, DailySalesRollup.day)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+
+        rows, next_offset = offset_page(q, limit, offset)
+        return [SALES_BY_GROUPS[by](r) for r in rows], 200, offset_headers(next_offset)
+
+
+
+SALES_BY_FIELDS = {
+    'product': ['product_id', 'product', 'quantity', 'total'],
+    'category': ['category_id', 'category', 'quantity', 'total'],
+    'user': ['user_id', 'user', 'quantity', 'total'],
+}
+
+
+@rep_ns.route('/sales-by/export')
+class SalesByExport(Resource):
+    def get(self):
+        """
+        Download every group of a sales-by report as CSV or NDJSON
+        Query params: by, start, end as /reports/sales-by, plus format: csv | ndjson
         """
         by = request.args.get('by', 'product')
-        start = request.args.get('start')
-        end = request.args.get('end')
-
-        q = db.session.query(InvoiceItem, Invoice, Product, User).join(
-            Invoice, InvoiceItem.invoice_id == Invoice.id
-        ).join(
-            Product, InvoiceItem.product_id == Product.id
-        ).outerjoin(
-            User, Invoice.created_by_id == User.id
-        )
-
-        if start:
-            start_dt = datetime.datetime.fromisoformat(start)
-            q = q.filter(Invoice.created_at >= start_dt)
-        if end:
-            end_dt = datetime.datetime.fromisoformat(end) + datetime.timedelta(days=1)
-            q = q.filter(Invoice.created_at < end_dt)
-
-        result = []
-
-        for item, invoice, product, user in q.all():
-            row = {
-                "product": product.name,
-                "total": item.subtotal_cents / 100.0,
-                "sale_by": user.username if user else "Unknown",
-                "date_time": invoice.created_at.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            result.append(row)
-
-        # Optionally, group by category or user if requested
-        if by == 'category':
-            grouped = {}
-            for r in result:
-                cat_name = Product.query.filter_by(name=r['product']).first().category.name
-                if cat_name not in grouped:
-                    grouped[cat_name] = 0
-                grouped[cat_name] += r['total']
-            result = [{"category": k, "total": v} for k, v in grouped.items()]
-
-        elif by == 'user':
-            grouped = {}
-            for r in result:
-                user_name = r['sale_by']
-                if user_name not in grouped:
-                    grouped[user_name] = 0
-                grouped[user_name] += r['total']
-            result = [{"user": k, "total": v} for k, v in grouped.items()]
-
-        return result, 200
+        if by not in SALES_BY_GROUPS:
+            return {'message': 'by must be one of: product, category, user'}, 400
+
+        try:
+            fmt = export_format()
+            q = filter_days(sales_by_query(by), request.args, DailySalesRollup.day)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        return stream_export(f'sales_by_{by}', fmt, SALES_BY_FIELDS[by], query_batches(q.statement), SALES_BY_GROUPS[by])
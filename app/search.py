@@ -0,0 +1,121 @@
+import re
+import unicodedata
+
+from sqlalchemy import column, false, func, literal_column, select, table
+from .extensions import db
+from .models import Product
+
+# Words beyond this are ignored, which bounds the cost of one query
+MAX_TERMS = 8
+
+# Only the newest RANK_WINDOW matches are ranked. A query vague enough to
+# match more (a two-letter prefix on a big catalog) still answers in
+# bounded time instead of scoring every match; older matches follow the
+# ranked ones, newest first, so paging still reaches every match.
+RANK_WINDOW = 500
+
+# Longest prefix the FTS5 index stores directly (prefix='2 3'); a longer
+# one is expanded to at most MAX_EXPANSIONS indexed words instead, which
+# is much cheaper than FTS5 merging every posting under the prefix
+INDEXED_PREFIX = 3
+MAX_EXPANSIONS = 20
+
+# Maintained by triggers on SQLite (see the add_product_search migration)
+PRODUCT_FTS = table("product_fts", column("rowid"))
+PRODUCT_FTS_TERMS = table("product_fts_terms", column("term"))
+
+
+def _fold(text):
+    # What the FTS5 unicode61 tokenizer does to indexed text
+    return "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+
+
+def search_terms(text):
+    """Split a search box entry into ``(word, is_prefix)`` pairs.
+
+    Words are lower-cased and punctuation dropped. Only the word still
+    being typed (the last one, unless the text ends in a space) matches as
+    a prefix, and only from two letters on; finished words match whole.
+    """
+    words = re.findall(r"\w+", _fold(text))[:MAX_TERMS]
+    typing = bool(words) and not text[-1:].isspace() and len(words[-1]) > 1
+    return [(word, typing and i == len(words) - 1) for i, word in enumerate(words)]
+
+
+def _fts_term(word, prefix):
+    if not prefix:
+        return f'"{word}"'
+    if len(word) <= INDEXED_PREFIX:
+        return f'"{word}"*'
+    words = db.session.execute(
+        select(PRODUCT_FTS_TERMS.c.term)
+        .where(PRODUCT_FTS_TERMS.c.term >= word, PRODUCT_FTS_TERMS.c.term < word + "\U0010ffff")
+        .limit(MAX_EXPANSIONS)
+    ).scalars().all()
+    return "(" + " OR ".join(f'"{w}"' for w in words) + ")" if words else None
+
+
+def match_products(query, terms, dialect_name):
+    """Restrict a Product query to rows matching every term.
+
+    ``terms`` comes from search_terms(). Returns ``(ranked, older)``:
+    ``ranked`` holds the RANK_WINDOW newest matches, those with more of
+    the words in their name first (PostgreSQL: higher ts_rank, with name
+    weighted above description), then newest first; ``older`` holds the
+    rest, newest first. Only per-product scores are used: corpus
+    statistics such as bm25's would mean reading every match. Words only
+    contain word characters, so they need no further escaping in either
+    syntax.
+    """
+    if dialect_name == "postgresql":
+        vector = literal_column("product.search_vector")
+        tsquery = func.to_tsquery("simple", " & ".join(f"{w}:*" if prefix else w for w, prefix in terms))
+        window = query.filter(vector.op("@@")(tsquery)).with_entities(Product.id)
+        window = window.order_by(Product.id.desc()).limit(RANK_WINDOW).subquery()
+        floor = select(func.min(window.c.id)).scalar_subquery()
+        ranked = query.filter(vector.op("@@")(tsquery), Product.id >= floor).order_by(
+            func.ts_rank(vector, tsquery).desc(), Product.id.desc()
+        )
+        return ranked, query.filter(vector.op("@@")(tsquery), Product.id < floor).order_by(Product.id.desc())
+
+    fts = literal_column("product_fts")
+    expressions = [_fts_term(word, prefix) for word, prefix in terms]
+    if None in expressions:
+        return query.filter(false()), query.filter(false())
+    match = fts.op("MATCH")(" AND ".join(expressions))
+    query = query.join(PRODUCT_FTS, PRODUCT_FTS.c.rowid == Product.id)
+
+    # Walking the index in rowid order is cheap; scoring is what costs
+    window = query.filter(match).with_entities(PRODUCT_FTS.c.rowid.label("id"))
+    window = window.order_by(PRODUCT_FTS.c.rowid.desc()).limit(RANK_WINDOW).subquery()
+    floor = select(func.min(window.c.id)).scalar_subquery()
+
+    # One point per word found in the name, looked up within the window
+    in_name = [
+        Product.id.in_(
+            select(PRODUCT_FTS.c.rowid)
+            .where(fts.op("MATCH")(f"name : {expression}"), PRODUCT_FTS.c.rowid >= floor)
+            .correlate(None)
+        )
+        for expression in expressions
+    ]
+    score = sum(in_name[1:], in_name[0])
+    ranked = query.filter(match, PRODUCT_FTS.c.rowid >= floor).order_by(score.desc(), Product.id.desc())
+    return ranked, query.filter(match, PRODUCT_FTS.c.rowid < floor).order_by(PRODUCT_FTS.c.rowid.desc())
+
+
+def search_page(ranked, older, limit, offset):
+    """One page of match_products() results: the ranked window, then the older matches.
+
+    Returns ``(rows, next_offset)`` like offset_page(). The older matches
+    are only queried on the page where the window runs out and after it,
+    and are read in index order, so early pages cost the same as before.
+    """
+    rows = ranked.limit(limit + 1).offset(offset).all()
+    if len(rows) <= limit:
+        # Offsets past the window count into the older matches
+        window = offset + len(rows) if rows else ranked.order_by(None).count()
+        rows += older.limit(limit + 1 - len(rows)).offset(offset + len(rows) - window).all()
+    if len(rows) > limit:
+        return rows[:limit], offset + limit
+    return rows, None
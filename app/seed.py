@@ -0,0 +1,227 @@
+import csv
+import io
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from PIL import Image, ImageDraw
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+
+from . import rollup
+from .cache import catalog_cache
+from .extensions import db
+from .images import store_image
+from .models import Category, Invoice, InvoiceItem, Product, User
+from .versions import bump
+
+CATEGORY_NAMES = (
+    "Bakery", "Dairy", "Produce", "Meat", "Seafood", "Frozen", "Beverages", "Snacks", "Pantry",
+    "Household", "Personal Care", "Baby", "Pet", "Stationery", "Electronics",
+)
+BRANDS = ("Acme", "Sunrise", "Golden", "Harvest", "Blue Ridge", "Northway", "Kind", "Pure", "Home", "Valley")
+ADJECTIVES = ("Fresh", "Organic", "Classic", "Premium", "Family", "Mini", "Large", "Spicy", "Sweet", "Light")
+NOUNS = (
+    "Apples", "Bananas", "Bread", "Milk", "Cheese", "Yogurt", "Butter", "Eggs", "Rice", "Pasta", "Coffee",
+    "Tea", "Juice", "Water", "Chips", "Cookies", "Cereal", "Chicken", "Beef", "Salmon", "Soap", "Shampoo",
+    "Tissues", "Batteries", "Notebook", "Pens", "Dog Food", "Diapers", "Honey", "Jam",
+)
+
+# Share of a day's sales in each hour: closed at night, busy at lunch and after work
+HOUR_WEIGHTS = (0, 0, 0, 0, 0, 0, 1, 3, 5, 6, 7, 9, 12, 11, 8, 7, 8, 11, 12, 10, 7, 4, 2, 1)
+
+
+def _images(count, rng):
+    # A few distinct pictures shared by many products, like a real catalog's
+    # placeholder and family shots; stored once each, content-addressed
+    filenames = []
+    for _ in range(count):
+        img = Image.new("RGB", (400, 400), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(6):
+            x, y = rng.randrange(300), rng.randrange(300)
+            draw.ellipse((x, y, x + rng.randint(40, 100), y + rng.randint(40, 100)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        filenames.append(store_image(buf.getvalue()))
+    return filenames
+
+
+def _daily_counts(invoices, days, start):
+    # Busier towards the end (growth) and at weekends; largest remainders
+    # make the counts add up to exactly ``invoices``
+    weights = [(0.6 + 0.4 * d / max(days - 1, 1)) * (1.3 if (start + timedelta(days=d)).weekday() >= 5 else 1)
+               for d in range(days)]
+    total = sum(weights)
+    shares = [invoices * w / total for w in weights]
+    counts = [int(s) for s in shares]
+    for d in sorted(range(days), key=lambda d: counts[d] - shares[d])[:invoices - sum(counts)]:
+        counts[d] += 1
+    return counts
+
+
+def _write(table, columns, rows):
+    """Bulk-insert ``rows`` (tuples in ``columns`` order) in the current transaction."""
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == "postgresql":
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        cursor = db.session.connection().connection.dbapi_connection.cursor()
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            buf.seek(0)
+            cursor.copy_expert(sql, buf)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+        return
+    # The driver's executemany on tuples; Core's per-row parameter handling
+    # would double the time of a large load. Bind processors still apply so
+    # values are stored exactly as the ORM stores them (SQLite datetimes).
+    dialect = db.session.get_bind().dialect
+    processors = [(i, table.c[c].type.bind_processor(dialect)) for i, c in enumerate(columns)]
+    processors = [(i, process) for i, process in processors if process]
+    if processors:
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for i, process in processors:
+                row[i] = process(row[i])
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    db.session.connection().exec_driver_sql(sql, rows)
+
+
+def generate(categories=15, products=5000, users=20, invoices=100000, days=365, images=20,
+             password="password", seed=42, batch_size=20000, echo=lambda message: None):
+    """Fill an empty database with a deterministic synthetic shop.
+
+    Product popularity is Zipf-like, basket sizes are mostly small with a
+    long tail, and sales follow opening hours, weekends and growth over
+    ``days`` days up to today. Everything derives from ``seed``. The catalog
+    is written with bulk Core inserts and sales with executemany (COPY on
+    PostgreSQL), ``batch_size`` invoices per transaction, and the sales
+    rollup is rebuilt at the end.
+    Returns the row counts written.
+    """
+    if db.session.execute(select(func.count()).select_from(Product)).scalar():
+        raise click.ClickException("The database already has products; seed an empty database")
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    version = bump("categories")
+    names = [CATEGORY_NAMES[i % len(CATEGORY_NAMES)] + (f" {i // len(CATEGORY_NAMES) + 1}" if i >= len(CATEGORY_NAMES) else "")
+             for i in range(categories)]
+    db.session.execute(insert(Category), [{"name": name, "version": version} for name in names])
+    category_ids = db.session.execute(select(Category.id).order_by(Category.id)).scalars().all()
+
+    filenames = _images(images, rng)
+    version = bump("products")
+    prices = []
+    for start in range(0, products, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, products)):
+            price = round(rng.lognormvariate(5.5, 0.9)) + 49
+            prices.append(price)
+            name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+            rows.append({
+                "name": f"{name} {rng.choice((250, 500, 750, 1000))}g",
+                "description": f"{name}, item {i + 1}",
+                "sku": f"SEED-{i + 1:08d}",
+                "price_cents": price,
+                "quantity": rng.randint(0, 500),
+                "image_filename": filenames[i % len(filenames)] if filenames else None,
+                "image_status": "ready" if filenames else None,
+                "version": version,
+                "category_id": rng.choice(category_ids),
+            })
+        db.session.execute(insert(Product), rows)
+    catalog = db.session.execute(select(Product.id, Product.category_id).order_by(Product.id)).all()
+    product_ids = [product_id for product_id, _ in catalog]
+    product_categories = [category_id for _, category_id in catalog]
+    echo(f"{categories} categories, {products} products, {len(filenames)} images")
+
+    # One hash for every seeded user: hashing is deliberately slow
+    password_hash = generate_password_hash(password, current_app.config["PASSWORD_HASH_METHOD"])
+    db.session.execute(insert(User), [
+        {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash}
+        for i in range(users)
+    ])
+    user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()
+    db.session.commit()
+
+    # Shuffled so the best sellers are spread over categories and ids
+    popularity = list(range(len(product_ids)))
+    rng.shuffle(popularity)
+    cumulative = list(accumulate(1 / (rank + 1) for rank in range(len(popularity))))
+    hours = list(accumulate(HOUR_WEIGHTS))
+
+    start_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    invoice_id = db.session.execute(select(func.coalesce(func.max(Invoice.id), 0))).scalar()
+    first_id = invoice_id + 1
+    invoice_columns = ("id", "customer_name", "customer_phone", "created_by_id", "total_cents", "created_at")
+    item_columns = ("invoice_id", "product_id", "quantity", "unit_price_cents", "subtotal_cents", "category_id")
+    invoice_rows, item_rows, item_count = [], [], 0
+
+    def flush():
+        _write(Invoice.__table__, invoice_columns, invoice_rows)
+        _write(InvoiceItem.__table__, item_columns, item_rows)
+        db.session.commit()
+        invoice_rows.clear()
+        item_rows.clear()
+
+    for day, count in enumerate(_daily_counts(invoices, days, start_day)):
+        # Sorted, so invoice ids increase with created_at as they would live
+        times = sorted(
+            start_day + timedelta(days=day, hours=bisect(hours, rng.random() * hours[-1]), seconds=rng.randrange(3600))
+            for _ in range(count)
+        )
+        for created_at in times:
+            invoice_id += 1
+            basket = min(1 + int(rng.expovariate(1 / 3)), 40)
+            total = 0
+            for index in rng.choices(popularity, cum_weights=cumulative, k=basket):
+                quantity = 1 if rng.random() < 0.75 else rng.randint(2, 6)
+                price = prices[index]
+                total += price * quantity
+                item_rows.append((invoice_id, product_ids[index], quantity, price, price * quantity, product_categories[index]))
+            item_count += basket
+            customer = rng.randrange(50000)
+            invoice_rows.append((invoice_id, f"Customer {customer}", f"555-{customer:05d}",
+                                 rng.choice(user_ids), total, created_at))
+            if len(invoice_rows) >= batch_size:
+                flush()
+                echo(f"{invoice_id - first_id + 1} invoices, {item_count} items ({time.perf_counter() - started:.0f}s)")
+    flush()
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        # COPY with explicit ids leaves the sequence behind
+        db.session.execute(text("SELECT setval(pg_get_serial_sequence('invoice', 'id'), (SELECT max(id) FROM invoice))"))
+        db.session.commit()
+    rollup.rebuild()
+    catalog_cache.invalidate("categories")
+    catalog_cache.invalidate("products")
+    return {"categories": categories, "products": products, "users": users, "invoices": invoices, "items": item_count}
+
+
+@click.command("seed")
+@click.option("--categories", default=15, show_default=True)
+@click.option("--products", default=5000, show_default=True)
+@click.option("--users", default=20, show_default=True, help="Named user0, user1, ...")
+@click.option("--invoices", default=100000, show_default=True, help="About 4 items each on average")
+@click.option("--days", default=365, show_default=True, help="Days of sales history, ending today")
+@click.option("--images", default=20, show_default=True, help="Distinct product images; 0 for none")
+@click.option("--password", default="password", show_default=True, help="Password of every seeded user")
+@click.option("--seed", "seed_value", default=42, show_default=True, help="Same seed, same data")
+@click.option("--batch-size", default=20000, show_default=True, help="Invoices per transaction")
+@with_appcontext
+def seed_command(categories, products, users, invoices, days, images, password, seed_value, batch_size):
+    """Fill an empty database with synthetic categories, products, users and sales."""
+    started = time.perf_counter()
+    counts = generate(categories, products, users, invoices, days, images, password, seed_value, batch_size, click.echo)
+    click.echo(", ".join(f"{n} {name}" for name, n in counts.items()) + f" in {time.perf_counter() - started:.0f}s")
@@ -0,0 +1,104 @@
+from sqlalchemy import case, func, select, update
+from .extensions import db
+from .models import InvoiceItem, Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Insufficient stock for product_id: {product_id}")
+        self.product_id = product_id
+
+
+def line_quantities(rows):
+    """Sum line quantities per product_id."""
+    totals = {}
+    for r in rows:
+        totals[r["product_id"]] = totals.get(r["product_id"], 0) + r["quantity"]
+    return totals
+
+
+def invoice_quantities(invoice_id):
+    """Quantities currently booked per product_id on a stored invoice."""
+    return dict(
+        db.session.query(InvoiceItem.product_id, func.sum(InvoiceItem.quantity))
+        .filter(InvoiceItem.invoice_id == invoice_id)
+        .group_by(InvoiceItem.product_id)
+        .all()
+    )
+
+
+def diff_quantities(new, old):
+    """Per-product change needed to go from ``old`` to ``new`` booked quantities."""
+    return {pid: new.get(pid, 0) - old.get(pid, 0) for pid in set(new) | set(old)}
+
+
+def stock_levels(product_ids):
+    """Quantity in stock per product_id, for a check made before adjust_stock().
+
+    Outside SQLite the rows are locked in id order, as adjust_stock() locks
+    them, and stay locked until the transaction ends, so the quantities
+    cannot change before the stock is taken.
+    """
+    if not product_ids:
+        return {}
+    q = select(Product.id, Product.quantity).where(Product.id.in_(product_ids)).order_by(Product.id)
+    if db.session.get_bind().dialect.name != "sqlite":
+        q = q.with_for_update()
+    return {pid: quantity or 0 for pid, quantity in db.session.execute(q)}
+
+
+def adjust_stock(deltas):
+    """Apply stock changes in the current transaction.
+
+    ``deltas`` maps product_id to units taken (positive) or put back
+    (negative). Takes are a single conditional
+    ``UPDATE ... SET quantity = quantity - n WHERE quantity >= n`` so two
+    workers selling the last unit cannot both succeed. Outside SQLite,
+    whose writers are already serialized, the rows are locked in id order
+    first so checkouts sharing SKUs queue instead of deadlocking.
+
+    Returns the ids of the products whose stock changed. Raises
+    InsufficientStock if any product cannot cover its take; the takes that
+    did succeed are put back first, so the transaction is left as it was
+    and the caller may carry on with other work in it.
+    """
+    deltas = {pid: n for pid, n in deltas.items() if pid is not None and n}
+    if not deltas:
+        return []
+
+    if db.session.get_bind().dialect.name != "sqlite":
+        db.session.execute(
+            select(Product.id).where(Product.id.in_(deltas)).order_by(Product.id).with_for_update()
+        )
+
+    taken = {pid: n for pid, n in deltas.items() if n > 0}
+    returned = {pid: -n for pid, n in deltas.items() if n < 0}
+
+    if taken:
+        amount = case(taken, value=Product.id)
+        covered = db.session.execute(
+            update(Product)
+            .where(Product.id.in_(taken), Product.quantity >= amount)
+            .values(quantity=Product.quantity - amount)
+            .returning(Product.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if len(covered) != len(taken):
+            if covered:
+                db.session.execute(
+                    update(Product)
+                    .where(Product.id.in_(covered))
+                    .values(quantity=Product.quantity + amount)
+                    .execution_options(synchronize_session=False)
+                )
+            raise InsufficientStock(min(set(taken) - set(covered)))
+
+    if returned:
+        amount = case(returned, value=Product.id)
+        db.session.execute(
+            update(Product)
+            .where(Product.id.in_(returned))
+            .values(quantity=func.coalesce(Product.quantity, 0) + amount)
+            .execution_options(synchronize_session=False)
+        )
+    return sorted(deltas)
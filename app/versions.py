@@ -0,0 +1,147 @@
+import threading
+import time
+
+from flask import current_app, request
+from sqlalchemy import insert, select, update
+
+from .extensions import db
+from .models import CatalogTombstone, CatalogVersion, Category, Product
+from .pagination import MAX_PAGE_SIZE
+
+MODELS = {"products": Product, "categories": Category}
+
+# Pending rows given a version per statement by stamp_pending()
+STAMP_BATCH = 1000
+
+# Per-worker memo of {collection: (version, fetched_at)}
+_current = {}
+_lock = threading.Lock()
+
+
+def current(collection):
+    """Latest committed version of ``collection``.
+
+    Remembered for CATALOG_VERSION_TTL seconds so repeated polls need no
+    query; a write in this worker forgets it immediately, a write in
+    another worker is seen once the memo expires.
+    """
+    now = time.monotonic()
+    with _lock:
+        hit = _current.get(collection)
+    if hit and now - hit[1] < current_app.config["CATALOG_VERSION_TTL"]:
+        return hit[0]
+
+    stamp_pending(collection)
+    version = db.session.query(CatalogVersion.version).filter_by(name=collection).scalar() or 0
+    with _lock:
+        _current[collection] = (version, now)
+    return version
+
+
+def forget(collection):
+    with _lock:
+        _current.pop(collection, None)
+
+
+def bump(collection, step=1, conn=None):
+    """Advance ``collection``'s version in the current transaction.
+
+    The counter row stays locked until commit, so versions become visible
+    in order and a client syncing with ?since never skips a change.
+    Returns the new version to stamp on the rows being written. ``conn``
+    runs it on another connection or session than db.session.
+    """
+    conn = conn or db.session
+    version = conn.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.name == collection)
+        .values(version=CatalogVersion.version + step)
+        .returning(CatalogVersion.version)
+    ).scalar()
+    if version is None:
+        conn.execute(insert(CatalogVersion).values(name=collection, version=step))
+        return step
+    return version
+
+
+def touch(collection, model, ids):
+    """Mark rows changed outside their own handlers (e.g. stock moves) as pending.
+
+    Unlike bump(), this leaves the counter row alone, so checkouts do not
+    queue behind one another on it; the rows get a version from the next
+    stamp_pending() instead.
+    """
+    if ids:
+        db.session.execute(
+            update(model).where(model.id.in_(ids)).values(version=0)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def stamp_pending(collection):
+    """Give the rows touch() left at version 0 a version, in a short transaction of its own.
+
+    Rows still locked by an uncommitted write are skipped; they are
+    stamped by a later call, after that write has committed, so ?since
+    clients see them under a newer version instead of missing them.
+    """
+    model = MODELS[collection]
+    pending = select(model.id).where(model.version == 0).order_by(model.id).limit(STAMP_BATCH)
+    stamped = 0
+    while True:
+        with db.engine.connect() as conn:
+            if conn.execute(pending.limit(1)).first() is None:
+                break
+        with db.engine.begin() as conn:
+            # Lock the counter before choosing rows, as changes.stamp_pending() does
+            bump(collection, 0, conn=conn)
+            ids = conn.execute(pending.with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                break
+            version = bump(collection, conn=conn)
+            conn.execute(update(model).where(model.id.in_(ids), model.version == 0).values(version=version))
+        stamped += len(ids)
+        if len(ids) < STAMP_BATCH:
+            break
+    if stamped:
+        forget(collection)
+    return stamped
+
+
+def tombstone(collection, item_id):
+    """Record a deletion so ?since clients learn about it."""
+    db.session.add(CatalogTombstone(collection=collection, item_id=item_id, version=bump(collection)))
+
+
+def changes_since(collection, model, to_dict):
+    """Handler-style response listing what changed after ``?since=<version>``.
+
+    Returns ``{"version", "changed", "deleted"}``; clients store ``version``
+    and pass it as ``since`` next time. If more than MAX_PAGE_SIZE rows
+    changed, answers 410 so the client reloads the full collection instead.
+    """
+    try:
+        since = int(request.args["since"])
+    except ValueError:
+        return {"message": "since must be an integer version"}, 400
+
+    stamp_pending(collection)
+    version = db.session.query(CatalogVersion.version).filter_by(name=collection).scalar() or 0
+    if since < 0 or since > version:
+        return {"message": f"since must be between 0 and {version}"}, 400
+
+    rows = (
+        model.query.filter(model.version > since)
+        .order_by(model.version, model.id)
+        .limit(MAX_PAGE_SIZE + 1)
+        .all()
+    )
+    if len(rows) > MAX_PAGE_SIZE:
+        return {"message": "Too many changes since this version; reload the full collection"}, 410
+
+    deleted = [
+        item_id for (item_id,) in db.session.query(CatalogTombstone.item_id)
+        .filter(CatalogTombstone.collection == collection, CatalogTombstone.version > since)
+        .order_by(CatalogTombstone.version)
+    ]
+    return {"version": version, "changed": [to_dict(r) for r in rows], "deleted": deleted}, 200
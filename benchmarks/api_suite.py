@@ -0,0 +1,263 @@
+"""Throughput, p50/p99 latency and SQL statements per request for every API namespace.
+
+Seeds a throwaway SQLite database (or DATABASE_URL, e.g. a local
+PostgreSQL) with the requested volumes using the `flask seed` generator,
+then drives each endpoint through the WSGI app with the response cache
+off and writes the results as JSON:
+
+    python benchmarks/api_suite.py --products 20000 --months 6 --output before.json
+    python benchmarks/api_suite.py --products 20000 --months 6 --compare before.json
+
+Same arguments and --seed give the same data and the same request
+sequence, so two runs differ only by the code under test. An existing
+DATABASE_URL that already holds products is reused as it is.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMESPACES = ("auth", "categories", "products", "invoices", "reports")
+
+
+def seed(args):
+    """Seed with ``flask seed``'s generator; stock is topped up so checkouts never run out."""
+    from sqlalchemy import func, select, update
+    from app.extensions import db
+    from app.models import Product
+    from app.seed import generate
+
+    if db.session.execute(select(func.count()).select_from(Product)).scalar():
+        return False
+    generate(categories=args.categories, products=args.products, users=args.users,
+             invoices=30 * args.months * args.invoices_per_day, days=30 * args.months,
+             images=0, password="bench", seed=args.seed)
+    db.session.execute(update(Product).values(quantity=10 ** 6))
+    db.session.commit()
+    return True
+
+
+def scenarios(args, rng, counter):
+    """``(namespace, name, method, path, kwargs factory, expected status)`` per endpoint."""
+    from app.seed import BRANDS, NOUNS
+    today = datetime.utcnow().date()
+    start = (today - timedelta(days=30 * args.months)).isoformat()
+    product = lambda: rng.randint(1, args.products)
+
+    def search_query():
+        # Words the seed generator puts in product names, whole or as a
+        # prefix being typed
+        word = rng.choice(NOUNS + BRANDS).split()[0].lower()
+        if rng.random() < 0.5:
+            word = word[:rng.randint(2, len(word))]
+        return f"/products/search?limit=20&q={word}"
+
+    def invoice_body():
+        return {"json": {"customer_name": "bench", "items": [
+            {"product_id": product(), "quantity": 1} for _ in range(rng.randint(1, 6))
+        ]}}
+
+    def product_form():
+        return {"data": {"name": f"bench product {next(counter)}", "price": "9.99", "quantity": "100",
+                         "category_id": str(rng.randint(1, args.categories))}}
+
+    def register():
+        n = next(counter)
+        return {"json": {"username": f"bench{n}", "email": f"bench{n}@example.com", "password": "bench"}}
+
+    return [
+        ("auth", "login", "POST", lambda: "/auth/login", lambda: {"json": {"username": f"user{rng.randrange(args.users)}", "password": "bench"}}, 200),
+        ("auth", "register", "POST", lambda: "/auth/register", register, 201),
+        ("categories", "list", "GET", lambda: "/categories", dict, 200),
+        ("categories", "get", "GET", lambda: f"/categories/{rng.randint(1, args.categories)}", dict, 200),
+        ("categories", "create", "POST", lambda: "/categories", lambda: {"json": {"name": f"bench category {next(counter)}"}}, 201),
+        ("products", "list", "GET", lambda: "/products?limit=50", dict, 200),
+        ("products", "list by category", "GET", lambda: f"/products?limit=50&category_id={rng.randint(1, args.categories)}", dict, 200),
+        ("products", "get", "GET", lambda: f"/products/{product()}", dict, 200),
+        ("products", "search", "GET", search_query, dict, 200),
+        ("products", "create", "POST", lambda: "/products", product_form, 201),
+        ("products", "update", "PUT", lambda: f"/products/{product()}", lambda: {"data": {"quantity": str(10 ** 6)}}, 200),
+        ("invoices", "list", "GET", lambda: "/invoices?limit=50", dict, 200),
+        ("invoices", "list by date", "GET", lambda: f"/invoices?limit=50&start={start}", dict, 200),
+        ("invoices", "get", "GET", lambda: f"/invoices/{rng.randint(1, args.months * 30 * args.invoices_per_day)}", dict, 200),
+        ("invoices", "create", "POST", lambda: "/invoices", invoice_body, 201),
+        ("reports", "sales daily", "GET", lambda: f"/reports/sales?range=daily&start={start}", dict, 200),
+        ("reports", "sales monthly", "GET", lambda: f"/reports/sales?range=monthly&start={start}", dict, 200),
+        ("reports", "sales by product", "GET", lambda: f"/reports/sales-by?by=product&limit=10&start={start}", dict, 200),
+        ("reports", "sales by category", "GET", lambda: f"/reports/sales-by?by=category&start={start}", dict, 200),
+    ]
+
+
+def is_empty(body):
+    """True for a list response, or a dict of lists, with nothing in it."""
+    if isinstance(body, list):
+        return not body
+    lists = [v for v in body.values() if isinstance(v, list)] if isinstance(body, dict) else []
+    return bool(lists) and not any(lists)
+
+
+def run_scenario(app, headers, scenario, args, statements):
+    namespace, name, method, path, make_kwargs, expected = scenario
+    plan = [(path(), make_kwargs()) for _ in range(args.warmup + args.requests)]
+    warmup, plan = plan[:args.warmup], plan[args.warmup:]
+    client = app.test_client()
+    for url, kwargs in warmup:
+        client.open(url, method=method, headers=headers, **kwargs)
+
+    timings, queries, errors, empty = [], [], [], []
+    lock = threading.Lock()
+
+    def worker(part):
+        client = app.test_client()
+        for url, kwargs in part:
+            statements.count = 0
+            started = time.perf_counter()
+            resp = client.open(url, method=method, headers=headers, **kwargs)
+            elapsed = time.perf_counter() - started
+            with lock:
+                timings.append(elapsed * 1000)
+                queries.append(statements.count)
+                if resp.status_code != expected:
+                    errors.append(f"{resp.status_code} {url}")
+                elif method == "GET" and is_empty(resp.get_json(silent=True)):
+                    empty.append(url)
+
+    threads = [threading.Thread(target=worker, args=(plan[i::args.threads],)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "namespace": namespace,
+        "name": name,
+        "method": method,
+        "requests": len(timings),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "empty_results": len(empty),
+        "first_empty": empty[0] if empty else None,
+        "throughput_rps": round(len(timings) / wall, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(timings[max(0, int(len(timings) * 0.99) - 1)], 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "queries_per_request": round(statistics.fmean(queries), 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    before = {(r["namespace"], r["name"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'endpoint':<32} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>6}")
+    for r in results:
+        line = (f"{r['namespace'] + ' ' + r['name']:<32} {r['throughput_rps']:>8} {r['p50_ms']:>8} "
+                f"{r['p99_ms']:>8} {r['queries_per_request']:>8} {r['errors']:>6}")
+        old = before.get((r["namespace"], r["name"]))
+        if old:
+            change = (r["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0
+            line += f"   p50 {change:+.0f}%, queries {old['queries_per_request']} -> {r['queries_per_request']}"
+        print(line)
+        if r.get("empty_results"):
+            print(f"{'':<32} warning: {r['empty_results']} empty results, e.g. {r['first_empty']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--months", type=int, default=3, help="months of invoice history")
+    parser.add_argument("--invoices-per-day", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="concurrent clients per endpoint")
+    parser.add_argument("--only", nargs="+", choices=NAMESPACES, help="namespaces to run (default all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="api_suite_results.json")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+    os.environ["CATALOG_CACHE_TTL"] = "0"
+    os.environ["IMAGE_JOBS_ASYNC"] = "false"
+    # One token serves the whole run, which can outlast a 5 minute access token
+    os.environ.setdefault("JWT_ACCESS_TOKEN_EXPIRES", str(24 * 3600))
+
+    import itertools
+    import flask_migrate
+    from sqlalchemy import event
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(ROOT, "migrations"))
+        started = time.perf_counter()
+        if seed(args):
+            print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        client = app.test_client()
+        client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = client.post("/auth/login", json={"username": "bench", "password": "bench"}).get_json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Statements per request, counted per client thread
+        statements = threading.local()
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda *a: setattr(statements, "count", getattr(statements, "count", 0) + 1))
+
+        # Unique names for created rows, distinct between runs on one database
+        counter = itertools.count(int(time.time() * 1000))
+        results = [
+            run_scenario(app, headers, scenario, args, statements)
+            for scenario in scenarios(args, random.Random(args.seed + 1), counter)
+            if not args.only or scenario[0] in args.only
+        ]
+        dialect = db.engine.dialect.name
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "database": dialect,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"] or baseline.get("database") != dialect:
+            print(f"Note: {args.compare} was run with different settings; compare with care")
+    print_results(results, baseline)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
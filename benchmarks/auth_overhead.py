@@ -0,0 +1,101 @@
+"""Authentication cost per request, stateless access tokens against revocation lookups.
+
+Times GET /auth/protected, which does nothing beyond checking its token,
+in a throwaway SQLite database (or DATABASE_URL if set):
+
+    python benchmarks/auth_overhead.py --requests 5000
+
+"decode only" is decode_token() on its own: the signature and claims
+check, without a request. "access token" is the default path through the
+API. The "revocation ..." rows put back a store lookup for every token, as
+before refresh tokens, answered from the worker's cache or from the
+backend; "extra us" is their p50 over the access token's.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per case")
+    parser.add_argument("--warmup", type=int, default=100)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+
+    from flask_jwt_extended import decode_token
+    from sqlalchemy import event
+    from app import create_app
+    from app.blacklist import blacklist
+    from app.extensions import db, jwt
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        tokens = client.post("/auth/login", json={"username": "bench", "password": "bench"}).get_json()
+
+        statements = threading.local()
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda *a: setattr(statements, "count", getattr(statements, "count", 0) + 1))
+
+        stateless = jwt._token_in_blocklist_callback
+
+        def check_every_token(jwt_header, jwt_payload):
+            return blacklist.is_revoked(jwt_payload["jti"])
+
+        def run(headers, expected, cache_ttl=None, check_all=False):
+            jwt.token_in_blocklist_loader(check_every_token if check_all else stateless)
+            if cache_ttl is not None:
+                blacklist.negative_ttl = cache_ttl
+            timings, queries = [], []
+            for i in range(args.warmup + args.requests):
+                statements.count = 0
+                started = time.perf_counter()
+                resp = client.get("/auth/protected", headers=headers)
+                elapsed = time.perf_counter() - started
+                assert resp.status_code == expected, resp.get_json()
+                if i >= args.warmup:
+                    timings.append(elapsed * 10 ** 6)
+                    queries.append(statements.count)
+            jwt.token_in_blocklist_loader(stateless)
+            timings.sort()
+            return statistics.median(timings), timings[max(0, int(len(timings) * 0.99) - 1)], statistics.fmean(queries)
+
+        timings = []
+        for i in range(args.warmup + args.requests):
+            started = time.perf_counter()
+            decode_token(tokens["access_token"])
+            if i >= args.warmup:
+                timings.append((time.perf_counter() - started) * 10 ** 6)
+        timings.sort()
+        print(f"{'case':<22} {'p50 us':>8} {'p99 us':>8} {'extra us':>8} {'queries':>8}")
+        print(f"{'decode only':<22} {statistics.median(timings):>8.0f} {timings[max(0, int(len(timings) * 0.99) - 1)]:>8.0f}")
+
+        bearer = {"Authorization": f"Bearer {tokens['access_token']}"}
+        ttl = blacklist.negative_ttl
+        cases = [
+            ("access token", {}),
+            ("revocation, cached", {"check_all": True, "cache_ttl": 3600}),
+            ("revocation, backend", {"check_all": True, "cache_ttl": 0}),
+        ]
+        base = None
+        for name, options in cases:
+            p50, p99, queries = run(bearer, 200, **options)
+            base = p50 if base is None else base
+            print(f"{name:<22} {p50:>8.0f} {p99:>8.0f} {p50 - base:>8.0f} {queries:>8.1f}")
+        blacklist.negative_ttl = ttl
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Hammer checkout from many threads against the same SKUs.
+
+Every thread buys random baskets from a small pool of products until the
+stock runs out, and now and then edits or deletes one of its own
+invoices. The script then checks that no product went negative and that
+the stock sold matches the invoices left, and exits 1 if it does not or
+if any request failed with an unexpected status:
+
+    python benchmarks/checkout_contention.py --threads 16 --skus 5 --stock 200
+
+Uses a throwaway SQLite file unless DATABASE_URL points elsewhere.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--skus", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=100, help="checkouts per thread")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+
+    from sqlalchemy import func
+    from app import create_app
+    from app.extensions import db
+    from app.models import Category, InvoiceItem, Product
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Category(name="bench"))
+        db.session.flush()
+        db.session.add_all(
+            Product(name=f"sku-{i}", price_cents=100, quantity=args.stock, category_id=1)
+            for i in range(args.skus)
+        )
+        db.session.commit()
+
+    client = app.test_client()
+    client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+    token = client.post("/auth/login", json={"username": "bench", "password": "bench"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def basket(rng):
+        return {"customer_name": "bench",
+                "items": [{"product_id": pid, "quantity": rng.randint(1, 3)}
+                          for pid in rng.sample(range(1, args.skus + 1), rng.randint(1, args.skus))]}
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = app.test_client()
+        mine = []
+        for _ in range(args.attempts):
+            roll = rng.random()
+            if mine and roll < 0.1:
+                resp = local.put(f"/invoices/{rng.choice(mine)}", json=basket(rng), headers=headers)
+                action = "update"
+            elif mine and roll < 0.15:
+                resp = local.delete(f"/invoices/{mine.pop(rng.randrange(len(mine)))}", headers=headers)
+                action = "delete"
+            else:
+                resp = local.post("/invoices", json=basket(rng), headers=headers)
+                action = "create"
+                if resp.status_code == 201:
+                    mine.append(resp.get_json()["id"])
+            with lock:
+                outcomes[action, resp.status_code] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stock = dict(db.session.query(Product.id, Product.quantity).all())
+        sold = dict(
+            db.session.query(InvoiceItem.product_id, func.sum(InvoiceItem.quantity))
+            .group_by(InvoiceItem.product_id).all()
+        )
+
+    total = sum(outcomes.values())
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    # 409 is a sale refused for lack of stock; anything else is a failure
+    expected_status = {"create": (201, 409), "update": (200, 409), "delete": (200,)}
+    ok = True
+    for (action, status), count in sorted(outcomes.items()):
+        flag = "ok" if status in expected_status[action] else "UNEXPECTED"
+        ok = ok and flag == "ok"
+        print(f"{action} {status}: {count} {flag}")
+    for pid, left in sorted(stock.items()):
+        expected = args.stock - sold.get(pid, 0)
+        flag = "ok" if left == expected and left >= 0 else "MISMATCH"
+        ok = ok and flag == "ok"
+        print(f"product {pid}: sold {sold.get(pid, 0)}, left {left}, expected {expected} {flag}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
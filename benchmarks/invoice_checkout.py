@@ -0,0 +1,66 @@
+"""Statements and latency per invoice creation versus line count.
+
+Runs against a throwaway SQLite database (or DATABASE_URL if set):
+
+    python benchmarks/invoice_checkout.py --lines 1 10 50 100 250 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 50, 100, 250])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+
+    from sqlalchemy import event
+    from app import create_app
+    from app.extensions import db
+    from app.models import Category, Product
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Category(name="bench"))
+        db.session.flush()
+        db.session.add_all(
+            Product(name=f"sku-{i}", price_cents=100 + i, quantity=10 ** 9, category_id=1)
+            for i in range(max(args.lines))
+        )
+        db.session.commit()
+
+        client = app.test_client()
+        client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = client.post("/auth/login", json={"username": "bench", "password": "bench"}).get_json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        print(f"{'lines':>6} {'stmts/invoice':>14} {'p50 ms':>8} {'max ms':>8}")
+        for n in args.lines:
+            body = {"customer_name": "bench", "items": [{"product_id": i + 1, "quantity": 1} for i in range(n)]}
+            timings = []
+            statements.clear()
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                resp = client.post("/invoices", json=body, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                assert resp.status_code == 201, resp.get_json()
+            print(f"{n:>6} {len(statements) / args.repeat:>14.1f} "
+                  f"{statistics.median(timings):>8.2f} {max(timings):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Login throughput per core for different password hash settings.
+
+For each PASSWORD_HASH_METHOD, creates users hashed that way in a
+throwaway SQLite database (or DATABASE_URL if set) and has --threads
+clients log in at once through the API:
+
+    python benchmarks/login_throughput.py --threads 1 8 32 --logins 200
+
+Logins answered 503 (hash pool full) are counted as busy, not timed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+METHODS = ["scrypt:32768:8:1", "scrypt:16384:8:1", "pbkdf2:sha256:1000000", "pbkdf2:sha256:600000"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", nargs="+", default=METHODS)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--logins", type=int, default=100, help="logins per thread count")
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+
+    from sqlalchemy import delete, insert
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+    from app.passwords import passwords
+
+    app = create_app()
+    cores = os.cpu_count() or 1
+    print(f"{cores} cores, {app.config['PASSWORD_HASH_WORKERS']} hash workers")
+    print(f"{'method':<24} {'threads':>7} {'logins/s':>9} {'per core':>9} {'p50 ms':>8} {'p99 ms':>8} {'busy':>5}")
+    with app.app_context():
+        db.create_all()
+        for method in args.methods:
+            app.config["PASSWORD_HASH_METHOD"] = method
+            passwords.init_app(app)
+            password_hash = generate_password_hash("bench", method)
+            db.session.execute(delete(User))
+            db.session.execute(insert(User), [
+                {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": password_hash}
+                for i in range(args.users)
+            ])
+            db.session.commit()
+
+            for threads in args.threads:
+                timings, busy = [], []
+                lock = threading.Lock()
+
+                def worker(n, offset):
+                    client = app.test_client()
+                    for i in range(n):
+                        body = {"username": f"user{(offset + i) % args.users}", "password": "bench"}
+                        started = time.perf_counter()
+                        resp = client.post("/auth/login", json=body)
+                        elapsed = (time.perf_counter() - started) * 1000
+                        with lock:
+                            if resp.status_code == 503:
+                                busy.append(1)
+                            else:
+                                assert resp.status_code == 200, resp.get_json()
+                                timings.append(elapsed)
+
+                per_thread = max(1, args.logins // threads)
+                workers = [threading.Thread(target=worker, args=(per_thread, t * per_thread)) for t in range(threads)]
+                started = time.perf_counter()
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+                wall = time.perf_counter() - started
+
+                timings.sort()
+                rate = len(timings) / wall
+                print(f"{method:<24} {threads:>7} {rate:>9.1f} {rate / min(threads, cores):>9.1f} "
+                      f"{statistics.median(timings):>8.1f} {timings[max(0, int(len(timings) * 0.99) - 1)]:>8.1f} "
+                      f"{len(busy):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Latency of /products/search type-ahead queries on a large catalog.
+
+Builds a synthetic catalog in a throwaway SQLite database (or DATABASE_URL
+if set), migrated so the full-text index exists, then times each query
+through the API with the response cache disabled:
+
+    python benchmarks/product_search.py --products 500000 --repeat 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "apple banana cherry chocolate biscuit coffee tea milk bread butter cheese yogurt rice pasta "
+    "noodle sauce tomato onion garlic pepper salt sugar honey jam juice water soda chips cookie "
+    "cake cereal oat flour egg chicken beef pork fish shrimp tofu soap shampoo towel tissue "
+    "battery candle lamp cable charger notebook pencil marker glue tape"
+).split()
+ADJECTIVES = "red green small large organic fresh frozen dried spicy sweet classic premium family mini".split()
+QUERIES = ["c", "ch", "choc", "chocolate", "chocolate bis", "org", "organic app", "organic apple", "fresh mi", "premium coffee beans", "zz"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tmp, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(tmp, "uploads"))
+    os.environ["CATALOG_CACHE_TTL"] = "0"
+
+    import flask_migrate
+    from sqlalchemy import insert
+    from app import create_app
+    from app.extensions import db
+    from app.models import Category, Product
+
+    app = create_app()
+    migrations = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+    rng = random.Random(42)
+    with app.app_context():
+        flask_migrate.upgrade(directory=migrations)
+        db.session.add(Category(name="bench"))
+        db.session.flush()
+        started = time.perf_counter()
+        for start in range(0, args.products, 10000):
+            db.session.execute(insert(Product), [
+                {
+                    "name": f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                    "description": " ".join(rng.choices(WORDS, k=8)),
+                    "price_cents": rng.randint(50, 5000),
+                    "quantity": rng.randint(0, 100),
+                    "category_id": 1,
+                }
+                for i in range(start, min(start + 10000, args.products))
+            ])
+        db.session.commit()
+        print(f"Loaded {args.products} products in {time.perf_counter() - started:.1f}s")
+
+        client = app.test_client()
+        client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+        token = client.post("/auth/login", json={"username": "bench", "password": "bench"}).get_json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{'query':<24} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8}")
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                resp = client.get("/products/search", query_string={"q": query, "limit": 10}, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                assert resp.status_code == 200, resp.get_json()
+            timings.sort()
+            print(f"{query:<24} {len(resp.get_json()):>5} {statistics.median(timings):>8.2f} "
+                  f"{timings[int(len(timings) * 0.95) - 1]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
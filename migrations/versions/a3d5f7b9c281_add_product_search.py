@@ -0,0 +1,67 @@
+"""Add product full-text search
+
+Revision ID: a3d5f7b9c281
+Revises: f1c7e3a9b560
+Create Date: 2026-10-17 21:04:18.226903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5f7b9c281'
+down_revision = 'f1c7e3a9b560'
+branch_labels = None
+depends_on = None
+
+# SQLite keeps an FTS5 index over product(name, description) in step with
+# triggers. A later batch_alter_table on product recreates the table and
+# drops these triggers, so such a migration must run SQLITE_TRIGGERS again.
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER product_fts_au AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE product_fts USING fts5("
+            "name, description, content='product', content_rowid='id', prefix='2 3')"
+        )
+        # Lists the indexed words, to expand a typed prefix longer than the
+        # prefix index covers
+        op.execute("CREATE VIRTUAL TABLE product_fts_terms USING fts5vocab(product_fts, 'row')")
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(trigger)
+        op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        # A stored generated column is kept current by PostgreSQL itself
+        op.execute(
+            "ALTER TABLE product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED"
+        )
+        op.create_index('ix_product_search_vector', 'product', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for name in ('product_fts_au', 'product_fts_ad', 'product_fts_ai'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE product_fts_terms")
+        op.execute("DROP TABLE product_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_product_search_vector', table_name='product')
+        op.drop_column('product', 'search_vector')
@@ -0,0 +1,68 @@
+"""Number change_log entries after commit
+
+Revision ID: c3f9a5e7d214
+Revises: b8e4d2a6c193
+Create Date: 2026-10-18 10:27:05.914362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a5e7d214'
+down_revision = 'b8e4d2a6c193'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # seq moves from primary key to a nullable unique column filled in by
+    # readers (app/changes.py), so the table is rebuilt with an id key
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_change_log_created_at'))
+    op.rename_table('change_log', 'change_log_old')
+
+    op.create_table('change_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=True),
+    sa.Column('topic', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_change_log_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_change_log_seq'), ['seq'], unique=True)
+
+    op.execute("""
+        INSERT INTO change_log (seq, topic, action, item_id, created_at)
+        SELECT seq, topic, action, item_id, created_at FROM change_log_old ORDER BY seq
+    """)
+    op.drop_table('change_log_old')
+
+
+def downgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_change_log_seq'))
+        batch_op.drop_index(batch_op.f('ix_change_log_created_at'))
+    op.rename_table('change_log', 'change_log_new')
+
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('topic', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_change_log_created_at'), ['created_at'], unique=False)
+
+    # Entries nobody had read yet were never numbered and are dropped
+    op.execute("""
+        INSERT INTO change_log (seq, topic, action, item_id, created_at)
+        SELECT seq, topic, action, item_id, created_at FROM change_log_new WHERE seq IS NOT NULL
+    """)
+    op.drop_table('change_log_new')
@@ -0,0 +1,26 @@
+"""Add idempotency_key.claimed_at
+
+Revision ID: d7b3e9f1a425
+Revises: c3f9a5e7d214
+Create Date: 2026-10-18 16:42:11.308517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e9f1a425'
+down_revision = 'c3f9a5e7d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('idempotency_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('idempotency_key', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
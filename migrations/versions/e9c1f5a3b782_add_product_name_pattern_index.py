@@ -0,0 +1,29 @@
+"""Add a text_pattern_ops index on product.name for PostgreSQL
+
+Revision ID: e9c1f5a3b782
+Revises: d7b3e9f1a425
+Create Date: 2026-10-18 17:05:39.641208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c1f5a3b782'
+down_revision = 'd7b3e9f1a425'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves the ?name= prefix filter as LIKE 'abc%' whatever the database
+    # collation (app/routes/products.py); SQLite uses ix_product_name
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_product_name_pattern', 'product', ['name'],
+                        postgresql_ops={'name': 'text_pattern_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_product_name_pattern', table_name='product')